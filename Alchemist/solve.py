@@ -5,13 +5,14 @@ import sys
 sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
 from utils.remote_cw import remote_cw, RemoteConfig
-from utils.helper_cv import setup_cw, cap_pass_trace, plot_traces, PLATFORM, interact, upload_firmware
+from utils.helper_cv import setup_cw, cap_pass_trace, plot_traces, PLATFORM, interact, upload_firmware, verify_candidates
+from utils.trace_store import TraceStore, capture_into
+from utils.cpa import as_bytes, cpa_bytes, byte_model, RunningCPA, EarlyStop
+from utils.key_enum import log_probs, enumerate_keys, merge_keys, effort
 import numpy as np
-import matplotlib.pyplot as plt
 from rpyc.utils.classic import obtain
 from tqdm import trange, tqdm
 import os
-from itertools import product
 
 cfg = RemoteConfig(
     host="remotechipwhisperer.example", # replace with hostname of the remote pi or its IP address
@@ -22,15 +23,6 @@ cfg = RemoteConfig(
     remote_host="127.0.0.1",     # remote rpyc_classic bind address
 )
 
-def mean(X):
-    return np.sum(X, axis=0)/len(X)
-
-def std_dev(X, X_bar):
-    return np.sqrt(np.sum((X-X_bar)**2, axis=0))
-
-def cov(X, X_bar, Y, Y_bar):
-    return np.sum((X-X_bar)*(Y-Y_bar), axis=0)
-
 def main():
     with remote_cw(cfg) as cw:
 
@@ -53,88 +45,69 @@ def main():
         # Setup the target for simpleserial
         upload_firmware(cw, scope, prog, CHALLENGE_NAME)
 
-        # Create Hamming Weight dictionary
-        hw = [bin(x).count("1") for x in range(256)]
-        print("[+] Created Hamming Weight dictionary")
-
-        # Capturing traces
-        NSAMPLES = 400
-        traces = []
-        textin = [os.urandom(8) for _ in range(NSAMPLES)]
-        print("[+] Starting trace capture")
-        for i in trange(NSAMPLES):
-            traces.append(obtain(cap_pass_trace(scope, target, bytes(textin[i]), command="e")))
-        traces = np.array(traces)
-        print("[+] Finished trace capture")
-        np.save("traces/traces.npy", traces)
-
+        # Capturing traces until the CPA settles (at most MAX_TRACES)
+        MAX_TRACES = 2000
+        # picks up where an interrupted run stopped
+        store = TraceStore("traces/alchemist", scope=scope, firmware=f"{CHALLENGE_NAME}-{PLATFORM}.hex")
+        textin = store.inputs() + [os.urandom(8) for _ in range(MAX_TRACES - len(store))]
+        # stage one leaks HW(t ^ k1), stage two HW(t ^ k1 ^ k2): both are plain byte
+        # models, the second one guessing k1 ^ k2, so they can run before k1 is known
+        live = [RunningCPA(byte_model(i), window=[20+203*i+191]) for i in range(8)]
+        live += [RunningCPA(byte_model(i), window=slice(20+203*8+204*i, 20+203*8+204*(i+1))) for i in range(8)]
+        converged = EarlyStop(live, stable=5)
+        def consume(inputs, traces, done, total):
+            for c in live:
+                c.update(inputs, traces)
+            stop = converged()
+            print(f"\r[~] {done} traces, stable for {converged.streak}/{converged.stable}", end="", flush=True)
+            return stop
+        print(f"[+] Starting trace capture ({len(store)} already stored)")
+        capture_into(store, cw, scope, target, textin, chunk=25, consume=consume, command="e")
+        print()
+        print(f"[+] Finished trace capture: {len(store)} traces")
+        traces = store.traces()
+        textin = store.inputs()
+
+        values = as_bytes(textin)
+
+        # stage one: HW(t ^ k1) at one sample per 203-sample byte block
         assignment_index = 191
-        splitted_traces = [np.array([[trace[20+203*i:20+203*(i+1)][assignment_index]] for trace in traces]) for i in range(8)]
+        windows = [[20+203*i+assignment_index] for i in range(8)]
         # for i in range(8):
-        #     plot_traces(splitted_traces[i], 'traces/splitted_trace_byte_'+str(i)+'.png')
-        # Calculation of mean, stddev
-        t_bar = [mean(t) for t in splitted_traces]
-        t_std = [std_dev(t, t_bar[kbyte]) for kbyte, t in enumerate(splitted_traces)]
-        print("[+] Calculated mean and stddev of traces")
-        
-        possible_keys = []
-        key = [0]*8
-        for kbyte in range(8):
-            maxcpa = [0]*256
-            maxcpa_index = [0]*256
-            for kguess in range(256):
-                HWS = np.array([[hw[t[kbyte]^kguess] for t in textin]]).transpose()
-                HWS_bar = mean(HWS)
-                HWS_std = std_dev(HWS, HWS_bar)
-                covariances = cov(splitted_traces[kbyte], t_bar[kbyte], HWS, HWS_bar)
-                correlations = covariances / (t_std[kbyte] * HWS_std)
-                maxcpa[kguess] = np.max(np.abs(correlations))
-            key[kbyte] = np.argmax(maxcpa)
-            mean_cpa = np.mean(maxcpa)
-            std_cpa = np.std(maxcpa)
-            possible_indices = np.where(maxcpa > 0.95*maxcpa[key[kbyte]])[0]
-            possible_keys.append(possible_indices)
-            print(f"[+] Found key byte {kbyte}: {key[kbyte]:02x}, {maxcpa[key[kbyte]]:.6f}, maxcpa mean: {mean_cpa:.6f}+/-{std_cpa:.6f}, possible indices: {possible_indices}") 
-
-
-        splitted_traces = [np.array([trace[20+203*8+204*i:20+203*8+204*(i+1)] for trace in traces]) for i in range(8)]
-        # for i in range(8):
-        #     plot_traces(splitted_traces[i], 'traces/splitted_trace_byte_'+str(i)+'.png')
-
-        # Calculation of mean, stddev
-        t_bar = [mean(t) for t in splitted_traces]
-        t_std = [std_dev(t, t_bar[kbyte]) for kbyte, t in enumerate(splitted_traces)]
-        print("[+] Calculated mean and stddev of traces")
-        
-        key2 = [0]*8
-        for kbyte in range(8):
-            maxcpa = [0]*256
-            for kguess in range(256):
-                HWS = np.array([[hw[t[kbyte]^key[kbyte]^kguess] for t in textin]]).transpose()
-                HWS_bar = mean(HWS)
-                HWS_std = std_dev(HWS, HWS_bar)
-                covariances = cov(splitted_traces[kbyte], t_bar[kbyte], HWS, HWS_bar)
-                correlations = covariances / (t_std[kbyte] * HWS_std)
-                maxcpa[kguess] = np.max(np.abs(correlations))
-            key2[kbyte] = np.argmax(maxcpa)
-            mean_cpa = np.mean(maxcpa)
-            std_cpa = np.std(maxcpa)
-            possible_indices = np.where(maxcpa > 0.95*maxcpa[key2[kbyte]])[0]
-            new_possible_indices = np.append(possible_indices, [k^0xff for k in possible_indices])
-            possible_keys.append(new_possible_indices)
-            print(f"[+] Found key byte {kbyte}: {key2[kbyte]:02x}, {maxcpa[key2[kbyte]]:.6f}, maxcpa mean: {mean_cpa:.6f}+/-{std_cpa:.6f}, possible indices: {new_possible_indices}")
-
+        #     plot_traces(traces[:, 20+203*i:20+203*(i+1)], 'traces/splitted_trace_byte_'+str(i)+'.png')
+        stage1 = cpa_bytes(traces, values, windows)
+        key = [res.best for res in stage1]
+        for kbyte, res in enumerate(stage1):
+            maxcpa = res.peak
+            print(f"[+] Found key byte {kbyte}: {key[kbyte]:02x}, {maxcpa[key[kbyte]]:.6f}, maxcpa mean: {np.mean(maxcpa):.6f}+/-{np.std(maxcpa):.6f}, possible indices: {res.candidates(0.95)}")
+
+        # stage two: HW(t ^ k1 ^ k2) over the next eight 204-sample blocks, guessing g = k1 ^ k2
+        windows = [slice(20+203*8+204*i, 20+203*8+204*(i+1)) for i in range(8)]
+        stage2 = cpa_bytes(traces, values, windows)
+        key2 = [k ^ res.best for k, res in zip(key, stage2)]
+        for kbyte, res in enumerate(stage2):
+            maxcpa = res.peak
+            print(f"[+] Found key byte {kbyte}: {key2[kbyte]:02x}, {maxcpa[res.best]:.6f}, maxcpa mean: {np.mean(maxcpa):.6f}+/-{np.std(maxcpa):.6f}, possible indices: {[key[kbyte] ^ int(g) for g in res.candidates(0.95)]}")
+
+        # candidates in decreasing likelihood over the 16 independent guesses (k1 bytes, then g bytes).
+        # k and k ^ 0xff tie on |corr| and differ only in the sign of the correlation, which is one
+        # unknown per stage: one table per sign hypothesis, their streams merged by likelihood
+        tables = [np.vstack([log_probs(stage1, len(traces), s1), log_probs(stage2, len(traces), s2)])
+                  for s1 in (1, -1) for s2 in (1, -1)]
+        est = effort(*tables)
         print(f"[+] Found key: {''.join([f'{k:02x}' for k in key+key2])}")
-        resp = interact(scope, target, 'c', bytes(key+key2), bytes_to_read=17)
-        print(resp)
-
-        for key in tqdm(list(product(*possible_keys))):
-            print(f"[+] Trying key: {''.join([f'{k:02x}' for k in key])}")
-            resp = obtain(interact(scope, target, 'c', bytes(key), bytes_to_read=17))
-            if resp!=bytearray(b'deadlyWhiteJade!!'):
-                print(f"[+] Found key: {''.join([f'{k:02x}' for k in key])}")
-                print(f"[+] Response: {resp}")
-                break
+        print(f"[+] Expected trials: {est['expected']:.0f} (90%: {est['q90']:.0f}, 99%: {est['q99']:.0f})")
+
+        # tried on the Pi in batches, stopping at the first key the target does not answer with the decoy
+        MAX_TRIES = 1 << 16
+        candidates = (bytes(g[:8]) + bytes(k ^ x for k, x in zip(g[:8], g[8:]))
+                      for g, _ in merge_keys(*(enumerate_keys(t, limit=MAX_TRIES) for t in tables)))
+        tried, found, resp = verify_candidates(scope, target, 'c', candidates, read_bytes=17,
+                                               reject=b'deadlyWhiteJade!!', limit=MAX_TRIES)
+        if found is None:
+            print(f"[-] No key among the {tried} most likely candidates")
+        else:
+            print(f"[+] Found key: {found.hex()} after {tried} tries")
             print(f"[+] Response: {resp}")
 
 # [+] Trying key: 4e614a2d556752643270586b38763573
@@ -7,7 +7,6 @@ sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 from utils.remote_cw import remote_cw, RemoteConfig
 from utils.helper_cv import setup_cw, cap_pass_trace, plot_traces, PLATFORM, interact, reboot_flush, upload_firmware
 import numpy as np
-import matplotlib.pyplot as plt
 from rpyc.utils.classic import obtain
 
 cfg = RemoteConfig(
@@ -26,22 +25,13 @@ CHALLENGE_NAME = "darkGatekeeper"
 def main():
     with remote_cw(cfg) as cw:
         # This runs on the REMOTE machine inside the venv!
-        scope, target, prog = setup_cw(cw,cw.scope())
+        scope, target, prog = setup_cw(cw,cw.scope(), config="glitch-24MHz")
         # print(help(scope))
         # help(scope.glitch)
         # print(help(target))
 
-        # Setting up the scope for capturing
-        scope.adc.samples = 1000
-        BAUD = target.baud
-        CLOCK = scope.io.clkout
-        NEWCLOCK = 24e6
-        scope.io.clkout = NEWCLOCK
-        NEWCLOCK = scope.io.clkout
-        target.baud = BAUD * NEWCLOCK / CLOCK
-        scope.adc.clk_freq = 7500000.0
-        # print(f"[+] Changed baud rate from {BAUD} to {target.baud}")
-        # print(f"[+] Changed clkout from {CLOCK} to {NEWCLOCK}")
+        # Setting up the scope for capturing: 1000 samples, clkout 24 MHz (baud scaled with it),
+        # ADC 7.5 MHz -- the "glitch-24MHz" profile in utils/scope_config.py, applied by setup_cw
 
         upload_firmware(cw, scope, prog, CHALLENGE_NAME)
 
@@ -5,9 +5,8 @@ import sys
 sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
 from utils.remote_cw import remote_cw, RemoteConfig
-from utils.helper_cv import setup_cw, cap_pass_trace, plot_traces, PLATFORM, interact, upload_firmware
+from utils.helper_cv import setup_cw, cap_pass_trace, plot_traces, PLATFORM, interact, upload_firmware, interact_then_capture
 import numpy as np
-import matplotlib.pyplot as plt
 from rpyc.utils.classic import obtain
 
 cfg = RemoteConfig(
@@ -44,10 +43,8 @@ def main():
         secret_array = []
         
         for byte_pos in range(14, -1, -1):
-            interact(scope, target, command="x", pass_guess=b'')        
-            reference_trace = obtain(cap_pass_trace(scope, target, pass_guess=bytes([2, 0, 0, byte_pos]), command="p", reset=False))
-            interact(scope, target, command="x", pass_guess=b'')        
-            reference_trace_2 = obtain(cap_pass_trace(scope, target, pass_guess=bytes([2, 1, 0, byte_pos]), command="p", reset=False))
+            reference_trace = interact_then_capture(scope, target, "x", b"", 1, "p", bytes([2, 0, 0, byte_pos]), 1)
+            reference_trace_2 = interact_then_capture(scope, target, "x", b"", 1, "p", bytes([2, 1, 0, byte_pos]), 1)
             diff_ref = np.sum(np.abs(reference_trace - reference_trace_2))
             #print(f"Diff for {0} and {1}: {diff_ref}")
             #plot_traces([reference_trace, reference_trace_2], filename=f"traces/traces_bytepos_{byte_pos}.png")
@@ -57,8 +54,7 @@ def main():
             secret_byte = 2
             while min_i <= max_i:
                 i = (min_i + max_i) // 2
-                interact(scope, target, command="x", pass_guess=b'')        
-                trace = obtain(cap_pass_trace(scope, target, pass_guess=bytes([2, i&0xff, i>>8, byte_pos]), command="p", reset=False))
+                trace = interact_then_capture(scope, target, "x", b"", 1, "p", bytes([2, i&0xff, i>>8, byte_pos]), 1)
                 diff = np.abs(trace - reference_trace)
                 #print(f"Diff for {i} at position {byte_pos+1}: {np.sum(diff)}")
                 if np.sum(diff) > diff_ref+80:
@@ -2,24 +2,13 @@ from pathlib import Path
 import sys
 import os
 import numpy as np
-import matplotlib
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt
-
-plt.rcParams.update({
-    "font.size": 14,        # base font size
-    "axes.titlesize": 18,   # ax.set_title
-    "axes.labelsize": 16,   # ax.set_xlabel / set_ylabel
-    "xtick.labelsize": 14,
-    "ytick.labelsize": 14,
-    "legend.fontsize": 14,
-})
 
 # Adding parent directory to the path to access utils
 sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
 from utils.remote_cw import remote_cw, RemoteConfig
-from utils.helper_cv import setup_cw, cap_pass_trace, plot_traces, PLATFORM, interact, upload_firmware
+from utils.helper_cv import setup_cw, cap_pass_trace, plot_traces, PLATFORM, interact, upload_firmware, interact_then_capture
+from utils.plotting import Plotter, FIG_STYLE
 from rpyc.utils.classic import obtain
 
 cfg = RemoteConfig(
@@ -36,9 +25,9 @@ def ensure_figures_dir():
     out.mkdir(parents=True, exist_ok=True)
     return out
 
-def save_overlay(reference_trace, final_trace, byte_pos, out_dir, crop=None):
+def save_overlay(plots, reference_trace, final_trace, byte_pos, out_dir, crop=None):
     """
-    Save a two-panel overlay (reference vs final) and their difference.
+    Queue a two-panel overlay (reference vs final) and their difference on `plots` (a Plotter).
     If crop is None, automatically pick a window around the largest absolute difference.
     """
     ref = np.array(reference_trace).squeeze()
@@ -61,33 +50,14 @@ def save_overlay(reference_trace, final_trace, byte_pos, out_dir, crop=None):
         start = max(0, start)
         end = min(S, end)
 
-    x = np.arange(start, end)
-    ref_win = ref[start:end]
-    cand_win = cand[start:end]
-    diff_win = cand_win - ref_win
-
-    fig, (ax1, ax2) = plt.subplots(2, 1, sharex=True, figsize=(10,4),
-                                   gridspec_kw={'height_ratios':[3,1]})
-    ax1.plot(x, ref_win, linewidth=1, label='reference')
-    ax1.plot(x, cand_win, linewidth=1, alpha=0.9, label=f'final guess {byte_pos}')
-    ax1.set_ylabel('ADC')
-    ax1.legend(loc='upper right')
-    ax1.set_title(f'Mean traces — reference vs final guess (position {byte_pos+1})')
-
-    ax2.plot(x, diff_win, linewidth=1)
-    ax2.set_ylabel('difference')
-    ax2.set_xlabel('sample index')
-    ax2.axhline(0, color='k', linewidth=0.5, alpha=0.5)
-
-    plt.tight_layout()
     png_path = out_dir / f"echoes_trace_overlay_pos{byte_pos}.png"
-    fig.savefig(png_path, dpi=200)
-    plt.close(fig)
+    plots.overlay(png_path, ref[start:end], cand[start:end], start=start, label=f'final guess {byte_pos}',
+                  title=f'Mean traces — reference vs final guess (position {byte_pos+1})')
     return str(png_path)
 
 def main():
     out_dir = ensure_figures_dir()
-    with remote_cw(cfg) as cw:
+    with remote_cw(cfg) as cw, Plotter(style=FIG_STYLE) as plots:
         # This runs on the REMOTE machine inside the venv!
         scope, target, prog = setup_cw(cw,cw.scope())
 
@@ -103,10 +73,8 @@ def main():
         
         for byte_pos in range(14, -1, -1):
             # baseline references
-            interact(scope, target, command="x", pass_guess=b'')        
-            reference_trace = obtain(cap_pass_trace(scope, target, pass_guess=bytes([2, 0, 0, byte_pos]), command="p", reset=False))
-            interact(scope, target, command="x", pass_guess=b'')        
-            reference_trace_2 = obtain(cap_pass_trace(scope, target, pass_guess=bytes([2, 1, 0, byte_pos]), command="p", reset=False))
+            reference_trace = interact_then_capture(scope, target, "x", b"", 1, "p", bytes([2, 0, 0, byte_pos]), 1)
+            reference_trace_2 = interact_then_capture(scope, target, "x", b"", 1, "p", bytes([2, 1, 0, byte_pos]), 1)
             diff_ref = np.sum(np.abs(reference_trace - reference_trace_2))
 
             min_i = 2
@@ -114,8 +82,7 @@ def main():
             secret_byte = 2
             while min_i <= max_i:
                 i = (min_i + max_i) // 2
-                interact(scope, target, command="x", pass_guess=b'')        
-                trace = obtain(cap_pass_trace(scope, target, pass_guess=bytes([2, i&0xff, i>>8, byte_pos]), command="p", reset=False))
+                trace = interact_then_capture(scope, target, "x", b"", 1, "p", bytes([2, i&0xff, i>>8, byte_pos]), 1)
                 diff = np.abs(trace - reference_trace)
                 if np.sum(diff) > diff_ref+80:
                     max_i = i-1
@@ -125,13 +92,12 @@ def main():
 
             # Capture a final trace for the recovered value and save overlay
             final_guess_bytes = bytes([2, secret_byte & 0xff, (secret_byte >> 8) & 0xff, byte_pos])
-            interact(scope, target, command="x", pass_guess=b'')
-            final_trace = obtain(cap_pass_trace(scope, target, pass_guess=final_guess_bytes, command="p", reset=False))
+            final_trace = interact_then_capture(scope, target, "x", b"", 1, "p", final_guess_bytes, 1)
 
             # Save overlay plot (auto-crop)
             try:
-                png_path = save_overlay(reference_trace, final_trace, byte_pos, out_dir, crop=None)
-                print(f"[+] Saved overlay plot: {png_path}")
+                png_path = save_overlay(plots, reference_trace, final_trace, byte_pos, out_dir, crop=None)
+                print(f"[+] Queued overlay plot: {png_path}")
             except Exception as e:
                 print(f"[!] Failed to save overlay for pos {byte_pos}: {e}")
 
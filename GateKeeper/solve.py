@@ -7,7 +7,6 @@ sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 from utils.remote_cw import remote_cw, RemoteConfig
 from utils.helper_cv import setup_cw, cap_pass_trace, plot_traces, PLATFORM
 import numpy as np
-import matplotlib.pyplot as plt
 from rpyc.utils.classic import obtain
 
 cfg = RemoteConfig(
@@ -73,8 +72,8 @@ def main():
         # Check if the found flag is correct
         cap_pass_trace(scope, target, flag, command="a", verbose=True)
 
-        # Reset target for the next challenge
-        cw.program_target(scope, prog, "/home/pi/remote_files/gatekeeper-{}.hex".format(PLATFORM))
+        # Reset target for the next challenge (force: same image, but the state must be fresh)
+        cw.program_target(scope, prog, "/home/pi/remote_files/gatekeeper-{}.hex".format(PLATFORM), force=True)
         print("[+] Reprogrammed target with gatekeeper-{}.hex".format(PLATFORM))
 
         # Attack loop for gk2
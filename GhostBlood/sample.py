@@ -8,7 +8,6 @@ sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 from utils.remote_cw import remote_cw, RemoteConfig
 from utils.helper_cv import setup_cw, cap_pass_trace, plot_traces, PLATFORM, interact
 import numpy as np
-import matplotlib.pyplot as plt
 from rpyc.utils.classic import obtain
 from tqdm import trange
 
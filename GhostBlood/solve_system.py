@@ -6,9 +6,8 @@ import sys
 sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
 from utils.remote_cw import remote_cw, RemoteConfig
-from utils.helper_cv import setup_cw, cap_pass_trace, plot_traces, PLATFORM, interact, reset_target
+from utils.helper_cv import setup_cw, cap_pass_trace, plot_traces, PLATFORM, interact, reset_target, verify_candidates
 import numpy as np
-import matplotlib.pyplot as plt
 from rpyc.utils.classic import obtain
 from tqdm import trange
 
@@ -21,19 +20,29 @@ cfg = RemoteConfig(
     remote_host="127.0.0.1",     # remote rpyc_classic bind address
 )
 
-def try_solve(k):
+# 'd' always answers with 21 bytes; only the right key decrypts them to a printable flag
+FLAG_RE = rb"^ESC\{[\x20-\x7e]{16}\}$"
+
+def key_bytes(k):
+    KEY = bytearray(16)
+    for i, n in enumerate(k):
+        KEY[i*2] = n&0xFF
+        KEY[i*2+1] = n >> 8
+    return bytes(KEY)
+
+def try_solve(guesses):
+    # one session for every guess; the Pi tries them in batches and stops at the first flag
     with remote_cw(cfg) as cw:
         # This runs on the REMOTE machine inside the venv!
         scope, target, prog = setup_cw(cw,cw.scope())
 
-        KEY = bytearray(16)
-        for i, n in enumerate(k):
-            KEY[i*2] = n&0xFF
-            KEY[i*2+1] = n >> 8
-
-        target.simpleserial_write('d', bytes(KEY))
-        flag = target.simpleserial_read('r', 21, timeout=50)
-        print("RESPONSE:", flag)
+        tried, KEY, flag = verify_candidates(scope, target, 'd', (key_bytes(k) for k in guesses), read_bytes=21,
+                                             accept=FLAG_RE, compute_ms=50)
+        if KEY is None:
+            print(f"[-] None of the {tried} key guesses decrypts the flag")
+        else:
+            print(f"[+] Key {KEY.hex()} after {tried} guesses")
+            print("RESPONSE:", flag)
 
 from z3 import *
 import json,sys
@@ -99,6 +108,17 @@ def block_cipher(key, shifts):
     #x[10], x[11], x[8], x[9] = quarter_round(x[10], x[11], x[8], x[9], shifts)
     #x[15], x[12], x[13], x[14] = quarter_round(x[15], x[12], x[13], x[14], shifts)
 
+def key_guesses():
+    # all solutions, one model at a time, solved as verify_candidates pulls the next batch
+    while SOLVER.check() == sat:
+        model = SOLVER.model()
+        key_guess = [model[k].as_long() if model[k] is not None else None for k in key]
+        print(f"[+] Key guess: {[hex(k) if k is not None else None for k in key_guess]}")
+        yield key_guess
+
+        # add constraint to avoid this solution
+        SOLVER.add(Or([k != model[k] for k in key if model[k] is not None]))
+
 def main():
     global SAMPLES
 
@@ -132,16 +152,7 @@ def main():
             break
 
     if SOLVER.check() == sat:
-        # print all solutions
-        while SOLVER.check() == sat:
-            model = SOLVER.model()
-            key_guess = [model[k].as_long() if model[k] is not None else None for k in key]
-            print(f"[+] Key guess: {[hex(k) if k is not None else None for k in key_guess]}")
-
-            try_solve(key_guess)
-
-            # add constraint to avoid this solution
-            SOLVER.add(Or([k != model[k] for k in key if model[k] is not None]))
+        try_solve(key_guesses())
     else:
         print("[-] No solution found")
 
@@ -5,9 +5,8 @@ import sys
 sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
 from utils.remote_cw import remote_cw, RemoteConfig
-from utils.helper_cv import setup_cw, cap_pass_trace, plot_traces, PLATFORM, interact
+from utils.helper_cv import setup_cw, cap_pass_trace, plot_traces, PLATFORM, interact, interact_then_capture
 import numpy as np
-import matplotlib.pyplot as plt
 from rpyc.utils.classic import obtain
 
 cfg = RemoteConfig(
@@ -45,17 +44,14 @@ def main():
         # Attack loop for SorterSong1
         secret_array = []
         # Get reference diff for no sorting
-        interact(scope, target, command="p", pass_guess=bytes([1, 0, 0, 0]), bytes_to_read=2)
-        reference_trace = obtain(cap_pass_trace(scope, target, b'', command="c", reset=False))
-        interact(scope, target, command="p", pass_guess=bytes([1, 1, 0, 0]), bytes_to_read=2)
-        reference_trace_2 = obtain(cap_pass_trace(scope, target, b'', command="c", reset=False))
+        reference_trace = interact_then_capture(scope, target, "p", bytes([1, 0, 0, 0]), 2, "c", b"", 1)
+        reference_trace_2 = interact_then_capture(scope, target, "p", bytes([1, 1, 0, 0]), 2, "c", b"", 1)
         diff_ref = np.sum(np.abs(reference_trace - reference_trace_2))
         #print(f"Diff for 0 and 1: {diff_ref}")
 
         # First iteration for byte 0
         for i in range(2, 30):
-            interact(scope, target, command="p", pass_guess=bytes([1, i, 0, 0]), bytes_to_read=2)
-            trace = obtain(cap_pass_trace(scope, target, b'', command="c", reset=False))
+            trace = interact_then_capture(scope, target, "p", bytes([1, i, 0, 0]), 2, "c", b"", 1)
             dft_trace = np.fft.rfft(trace)
             diff = np.abs(trace - reference_trace)
             #print(f"Diff for {i} for position 1: {np.sum(diff)}")
@@ -69,15 +65,12 @@ def main():
         interact(scope, target, command="x", pass_guess=b'')
         
         for byte_pos in range(len(secret_array), 15):
-            interact(scope, target, command="p", pass_guess=bytes([1, secret_array[-1]-1, 0, byte_pos]), bytes_to_read=2)
-            reference_trace = obtain(cap_pass_trace(scope, target, b'', command="c", reset=False))
-            interact(scope, target, command="p", pass_guess=bytes([1, secret_array[-1], 0, byte_pos]), bytes_to_read=2)
-            reference_trace_2 = obtain(cap_pass_trace(scope, target, b'', command="c", reset=False))
+            reference_trace = interact_then_capture(scope, target, "p", bytes([1, secret_array[-1]-1, 0, byte_pos]), 2, "c", b"", 1)
+            reference_trace_2 = interact_then_capture(scope, target, "p", bytes([1, secret_array[-1], 0, byte_pos]), 2, "c", b"", 1)
             diff_ref = np.sum(np.abs(reference_trace - reference_trace_2))
             #print(f"Diff for {secret_array[-1]-1} and {secret_array[-1]}: {diff_ref}")
             for i in range(secret_array[-1]+1, 255):
-                interact(scope, target, command="p", pass_guess=bytes([1, i, 0, byte_pos]), bytes_to_read=2)
-                trace = obtain(cap_pass_trace(scope, target, b'', command="c", reset=False))
+                trace = interact_then_capture(scope, target, "p", bytes([1, i, 0, byte_pos]), 2, "c", b"", 1)
                 diff = np.abs(trace - reference_trace)
                 #print(f"Diff for {i} at position {byte_pos+1}: {np.sum(diff)}")
                 if np.sum(diff) > diff_ref+100:
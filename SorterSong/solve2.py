@@ -5,9 +5,8 @@ import sys
 sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
 from utils.remote_cw import remote_cw, RemoteConfig
-from utils.helper_cv import setup_cw, cap_pass_trace, plot_traces, PLATFORM, interact
+from utils.helper_cv import setup_cw, cap_pass_trace, plot_traces, PLATFORM, interact, interact_then_capture
 import numpy as np
-import matplotlib.pyplot as plt
 from rpyc.utils.classic import obtain
 
 cfg = RemoteConfig(
@@ -45,10 +44,8 @@ def main():
         # Attack loop for SorterSong1
         secret_array = []
         # Get reference diff for no sorting
-        interact(scope, target, command="p", pass_guess=bytes([2, 0, 0, 0]), bytes_to_read=2)
-        reference_trace = obtain(cap_pass_trace(scope, target, b'', command="d", reset=False))
-        interact(scope, target, command="p", pass_guess=bytes([2, 1, 0, 0]), bytes_to_read=2)
-        reference_trace_2 = obtain(cap_pass_trace(scope, target, b'', command="d", reset=False))
+        reference_trace = interact_then_capture(scope, target, "p", bytes([2, 0, 0, 0]), 2, "d", b"", 1)
+        reference_trace_2 = interact_then_capture(scope, target, "p", bytes([2, 1, 0, 0]), 2, "d", b"", 1)
         diff_ref = np.sum(np.abs(reference_trace - reference_trace_2))
         #print(f"Diff for 0 and 1: {diff_ref}")
 
@@ -58,8 +55,7 @@ def main():
         secret_byte = 1
         while min_i <= max_i:
             i = (min_i + max_i) // 2
-            interact(scope, target, command="p", pass_guess=bytes([2, i&0xff, i>>8, 0]), bytes_to_read=2)
-            trace = obtain(cap_pass_trace(scope, target, b'', command="d", reset=False))
+            trace = interact_then_capture(scope, target, "p", bytes([2, i&0xff, i>>8, 0]), 2, "d", b"", 1)
             dft_trace = np.fft.rfft(trace)
             diff = np.abs(trace - reference_trace)
             #print(f"Diff for {i} for position 1: {np.sum(diff)}")
@@ -76,10 +72,8 @@ def main():
         interact(scope, target, command="x", pass_guess=b'')
         
         for byte_pos in range(len(secret_array), 15):
-            interact(scope, target, command="p", pass_guess=bytes([2, (secret_array[-1]-1)&0xff, (secret_array[-1]-1)>>8, byte_pos]), bytes_to_read=2)
-            reference_trace = obtain(cap_pass_trace(scope, target, b'', command="d", reset=False))
-            interact(scope, target, command="p", pass_guess=bytes([2, secret_array[-1]&0xff, secret_array[-1]>>8, byte_pos]), bytes_to_read=2)
-            reference_trace_2 = obtain(cap_pass_trace(scope, target, b'', command="d", reset=False))
+            reference_trace = interact_then_capture(scope, target, "p", bytes([2, (secret_array[-1]-1)&0xff, (secret_array[-1]-1)>>8, byte_pos]), 2, "d", b"", 1)
+            reference_trace_2 = interact_then_capture(scope, target, "p", bytes([2, secret_array[-1]&0xff, secret_array[-1]>>8, byte_pos]), 2, "d", b"", 1)
             diff_ref = np.sum(np.abs(reference_trace - reference_trace_2))
             #print(f"Diff for {secret_array[-1]-1} and {secret_array[-1]}: {diff_ref}")
 
@@ -88,8 +82,7 @@ def main():
             secret_byte = secret_array[-1]
             while min_i <= max_i:
                 i = (min_i + max_i) // 2
-                interact(scope, target, command="p", pass_guess=bytes([2, i&0xff, i>>8, byte_pos]), bytes_to_read=2)
-                trace = obtain(cap_pass_trace(scope, target, b'', command="d", reset=False))
+                trace = interact_then_capture(scope, target, "p", bytes([2, i&0xff, i>>8, byte_pos]), 2, "d", b"", 1)
                 diff = np.abs(trace - reference_trace)
                 #print(f"Diff for {i} at position {byte_pos+1}: {np.sum(diff)}")
                 if np.sum(diff) > diff_ref+100:
@@ -0,0 +1,270 @@
+# bench_capture.py — capture throughput of each challenge's access pattern.
+#
+#   python benchmarks/bench_capture.py --backend sim
+#   python benchmarks/bench_capture.py --backend loopback --latency-ms 2
+#   python benchmarks/bench_capture.py --backend real --host remotechipwhisperer.example --key ~/.ssh/id_ecdsa
+#
+# Patterns (what the solve scripts do, scaled by --n):
+#   alchemist   random 8-byte plaintexts, capture_batch ('e')
+#   hyperspace  the 256-input sweep, capture_batch ('p')
+#   gatekeeper  reference + candidate per char, cap_pass_trace ('a') and an FFT each
+#   echoes      16-bit binary search: interact('x') + cap_pass_trace('p', reset=False)
+#   echoes_script  the same probes, each sent as one run_script (interact_then_capture)
+#   glitch      DarkGatekeeper/Calculation loop: glitch params, arm, write, capture, read_witherrors
+# Every pattern runs twice: "fused" through the helpers as the scripts call
+# them (traces/s, p50/p99 per trace), and "staged" with each step issued and
+# timed on its own, which gives the reset / drain / arm / serial / capture /
+# transfer split. --json / --baseline work as in bench_remote_cw.py (on tr/s).
+from pathlib import Path
+import sys
+
+# Adding parent directory to the path to access utils
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import argparse, json, os, time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import numpy as np
+from rpyc.utils.classic import obtain
+
+from utils.remote_cw import remote_cw, RemoteConfig, remote_ops_for
+from utils.helper_cv import setup_cw, cap_pass_trace, interact, reboot_flush, upload_firmware, interact_then_capture, PLATFORM
+
+STAGES = ("reset", "drain", "arm", "serial", "capture", "transfer", "analysis", "config")
+
+
+class Stages:
+    def __init__(self):
+        self.time = defaultdict(float)
+
+    @contextmanager
+    def __call__(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.time[name] += time.perf_counter() - t0
+
+
+class _NoStages(Stages):
+    @contextmanager
+    def __call__(self, name: str):
+        yield
+
+
+def staged_capture(st: Stages, scope, target, data: bytes, command: str, read_bytes: int = 18, reset: bool = True):
+    """cap_pass_trace one step at a time, each step timed."""
+    ops = remote_ops_for(target)
+    if reset:
+        with st("reset"):
+            ops.reset_target(scope, PLATFORM)
+    with st("drain"):
+        ops.drain(target)
+    with st("arm"):
+        scope.arm()
+    with st("serial"):
+        target.simpleserial_write(command, data)
+        target.simpleserial_read('r', read_bytes, timeout=50)
+    with st("capture"):
+        timeout = scope.capture()
+    with st("transfer"):
+        return None if timeout else obtain(scope.get_last_trace())
+
+
+# ---------------- patterns ----------------
+# each yields once per trace so the driver can time it
+def _batch(cw, scope, target, st, staged, inputs, command, chunk=32):
+    if staged:
+        for data in inputs:
+            staged_capture(st, scope, target, data, command)
+            yield 1
+        return
+    for i in range(0, len(inputs), chunk):
+        part = inputs[i:i + chunk]
+        cw.capture_batch(scope, target, part, command=command)
+        yield len(part)
+
+
+def alchemist(cw, scope, target, st, staged, n):
+    yield from _batch(cw, scope, target, st, staged, [os.urandom(8) for _ in range(n)], "e")
+
+
+def hyperspace(cw, scope, target, st, staged, n):
+    yield from _batch(cw, scope, target, st, staged, [bytes([i & 0xff]) for i in range(n)], "p")
+
+
+def gatekeeper(cw, scope, target, st, staged, n):
+    alphabet = b"abcdefghijklmnopqrstuvwxyz0123456789_"
+    ref = None
+    for k in range(n):
+        guess = b"gk1{" + bytes([alphabet[k % len(alphabet)]]) + b"\x01" * 7 + b"}"
+        if staged:
+            trace = staged_capture(st, scope, target, guess, "a")
+        else:
+            trace = obtain(cap_pass_trace(scope, target, guess, command="a"))
+        with st("analysis"):
+            spectrum = np.abs(np.fft.rfft(trace))
+            if ref is not None:
+                np.sum(np.abs(spectrum - ref))
+            ref = spectrum
+        yield 1
+
+
+def echoes(cw, scope, target, st, staged, n, script=False):
+    lo, hi = 2, 0xffff
+    for _ in range(n):
+        i = (lo + hi) // 2
+        data = bytes([2, i & 0xff, i >> 8, 0])
+        if staged:
+            with st("serial"):
+                ops = remote_ops_for(target)
+                ops.drain(target)
+                target.simpleserial_write("x", b"")
+                target.simpleserial_read('r', 1)
+            staged_capture(st, scope, target, data, "p", reset=False)
+        elif script:
+            interact_then_capture(scope, target, "x", b"", 1, "p", data, 1)
+        else:
+            interact(scope, target, command="x", pass_guess=b"")
+            obtain(cap_pass_trace(scope, target, pass_guess=data, command="p", reset=False))
+        lo, hi = (lo, i - 1) if i & 1 else (i + 1, hi)
+        if lo > hi:
+            lo, hi = 2, 0xffff
+        yield 1
+
+
+def echoes_script(cw, scope, target, st, staged, n):
+    yield from echoes(cw, scope, target, st, staged, n, script=True)
+
+
+def glitch(cw, scope, target, st, staged, n):
+    for k in range(n):
+        with st("config"):
+            scope.glitch.repeat = 2 + k % 3
+            scope.glitch.ext_offset = 5 + k % 36
+        with st("arm"):
+            scope.arm()
+        with st("serial"):
+            target.simpleserial_write('a', b"asdfasdfasdf")
+        with st("capture"):
+            timeout = scope.capture()
+        if timeout:
+            with st("reset"):
+                reboot_flush(scope, target)
+        else:
+            with st("serial"):
+                target.simpleserial_read_witherrors('r', 18, glitch_timeout=10, timeout=50)
+        yield 1
+
+
+PATTERNS = {  # name -> (pattern, firmware, default count)
+    "alchemist": (alchemist, "alchemistInfuser", 256),
+    "hyperspace": (hyperspace, "hyperspaceJumpDrive", 256),
+    "gatekeeper": (gatekeeper, "gatekeeper", 74),
+    "echoes": (echoes, "chaos", 64),
+    "echoes_script": (echoes_script, "chaos", 64),
+    "glitch": (glitch, "darkGatekeeper", 128),
+}
+
+
+# ---------------- driver ----------------
+@contextmanager
+def open_backend(args):
+    if args.backend == "sim":
+        with remote_cw(RemoteConfig(host="sim", user="sim", transport="sim", verbose=False)) as cw:
+            yield cw
+    elif args.backend == "loopback":
+        from loopback import LoopbackPi
+        with LoopbackPi(latency_s=args.latency_ms / 1000) as pi:
+            with remote_cw(pi.config(transport=args.transport)) as cw:
+                yield cw
+    else:
+        cfg = RemoteConfig(host=args.host, user=args.user, key_filename=args.key, transport=args.transport,
+                           verbose=False)
+        with remote_cw(cfg) as cw:
+            yield cw
+
+
+def flash(cw, scope, prog, firmware: str, backend: str):
+    if backend == "real":
+        upload_firmware(cw, scope, prog, firmware)
+    else:  # sim models are picked by name; there is no .hex to upload
+        cw.program_target(scope, prog, f"{firmware}-{PLATFORM}.hex")
+
+
+def run(pattern, cw, scope, target, staged: bool, n: int):
+    st = Stages() if staged else _NoStages()
+    per_trace = []
+    t0 = last = time.perf_counter()
+    traces = 0
+    for count in pattern(cw, scope, target, st, staged, n):
+        now = time.perf_counter()
+        per_trace += [(now - last) / count] * count
+        traces += count
+        last = now
+    return traces, time.perf_counter() - t0, np.array(per_trace), st.time
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--backend", choices=("sim", "loopback", "real"), default="sim")
+    ap.add_argument("--patterns", default=",".join(PATTERNS))
+    ap.add_argument("--n", type=float, default=1.0, help="scale every pattern's trace count")
+    ap.add_argument("--samples", type=int, default=2000, help="scope.adc.samples")
+    ap.add_argument("--transport", default="channel")
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="loopback: one-way delay per relayed chunk")
+    ap.add_argument("--host")
+    ap.add_argument("--user", default="pi")
+    ap.add_argument("--key")
+    ap.add_argument("--json", help="write results here")
+    ap.add_argument("--baseline", help="results JSON of an earlier run to compare against")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs baseline (0.25 = 25%%)")
+    args = ap.parse_args()
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    results, slower = {}, []
+
+    head = f"{'pattern':<13} {'mode':<7} {'traces':>6} {'tr/s':>8} {'p50 ms':>8} {'p99 ms':>8}  " + \
+        " ".join(f"{s:>8}" for s in STAGES)
+    print(head)
+    print("-" * len(head))
+    with open_backend(args) as cw:
+        scope, target, prog = setup_cw(cw, cw.scope())
+        scope.adc.samples = args.samples
+        for name in args.patterns.split(","):
+            pattern, firmware, count = PATTERNS[name]
+            flash(cw, scope, prog, firmware, args.backend)
+            n = max(1, int(count * args.n))
+            for staged in (False, True):
+                traces, total, lat, stages = run(pattern, cw, scope, target, staged, n)
+                case = f"{name}/{'staged' if staged else 'fused'}"
+                results[case] = {
+                    "traces": traces,
+                    "traces_per_s": traces / total,
+                    "p50_ms": float(np.percentile(lat, 50) * 1e3),
+                    "p99_ms": float(np.percentile(lat, 99) * 1e3),
+                    "stages_s": dict(stages),
+                }
+                old = baseline.get(case, {}).get("traces_per_s")
+                mark = ""
+                if old is not None and traces / total < old / (1 + args.tolerance):
+                    mark = f"  SLOWER (was {old:.1f} tr/s)"
+                    slower.append(case)
+                split = " ".join(f"{100 * stages[s] / total:>7.1f}%" if s in stages else f"{'':>8}" for s in STAGES)
+                print(f"{name:<13} {'staged' if staged else 'fused':<7} {traces:>6} {traces / total:>8.1f} "
+                      f"{results[case]['p50_ms']:>8.2f} {results[case]['p99_ms']:>8.2f}  {split}{mark}", flush=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if slower:
+        print(f"{len(slower)} case(s) regressed beyond {args.tolerance:.0%}: {', '.join(slower)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# bench_remote_cw.py — remote_cw transport overhead, end to end, no hardware.
+#
+#   python benchmarks/bench_remote_cw.py [--latency-ms 2] [--json out.json] [--baseline old.json]
+#
+# Runs the real remote_cw(...) against LoopbackPi (stub sshd + rpyc_classic +
+# simulated chipwhisperer) and sweeps, per transport:
+#   calls    N small round trips (conn.eval) — per-call latency
+#   obtain   pulling an ndarray of S float64 samples back with obtain()
+#   put_file uploading S bytes (fresh content), then again (cache hit)
+# With --baseline, exits 1 if any timing is more than --tolerance slower.
+from pathlib import Path
+import sys
+
+# Adding parent directory to the path to access utils
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import argparse, json, os, statistics, tempfile, time
+
+from rpyc.utils.classic import obtain
+
+from utils.remote_cw import remote_cw
+from loopback import LoopbackPi
+
+
+def timed(fn, reps: int) -> float:
+    """Median seconds per call."""
+    samples = []
+    for _ in range(reps):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples)
+
+
+def bench_calls(cw, counts):
+    conn = cw._conn
+    out = {}
+    for n in counts:
+        t0 = time.perf_counter()
+        for _ in range(n):
+            conn.eval("42")
+        out[f"calls/{n}"] = time.perf_counter() - t0
+    return out
+
+
+def bench_obtain(cw, sizes, reps: int):
+    conn = cw._conn
+    np_remote = conn.modules["numpy"]
+    out = {}
+    for size in sizes:
+        arr = np_remote.zeros(size)
+        out[f"obtain/{size}"] = timed(lambda: obtain(arr), reps)
+    return out
+
+
+def bench_put_file(cw, sizes):
+    out = {}
+    cw._resolve_remote_files_dir()  # one-off directory probe, not part of the transfer
+    with tempfile.TemporaryDirectory(prefix="bench_put_") as tmp:
+        for size in sizes:
+            path = os.path.join(tmp, f"blob-{size}.bin")
+            with open(path, "wb") as f:
+                f.write(os.urandom(size))
+            t0 = time.perf_counter()
+            cw.put_file(path, f"bench-{size}.bin")
+            out[f"put_file/{size}"] = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            cw.put_file(path, f"bench-{size}.bin")
+            out[f"put_file_cached/{size}"] = time.perf_counter() - t0
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="one-way delay added per relayed chunk")
+    ap.add_argument("--transports", default="forward,channel")
+    ap.add_argument("--calls", default="1,10,100,1000")
+    ap.add_argument("--samples", default="1000,10000,100000,1000000", help="ndarray sizes for obtain()")
+    ap.add_argument("--files", default="1024,65536,1048576", help="file sizes for put_file()")
+    ap.add_argument("--reps", type=int, default=20)
+    ap.add_argument("--json", help="write results here")
+    ap.add_argument("--baseline", help="results JSON of an earlier run to compare against")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs baseline (0.25 = 25%%)")
+    args = ap.parse_args()
+
+    results = {}
+    with LoopbackPi(latency_s=args.latency_ms / 1000) as pi:
+        for transport in args.transports.split(","):
+            with remote_cw(pi.config(transport=transport)) as cw:
+                r = {}
+                r.update(bench_calls(cw, [int(x) for x in args.calls.split(",")]))
+                r.update(bench_obtain(cw, [int(x) for x in args.samples.split(",")], args.reps))
+                r.update(bench_put_file(cw, [int(x) for x in args.files.split(",")]))
+            results[transport] = r
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    print(f"{'transport':<10} {'case':<28} {'ms':>10} {'baseline':>10}")
+    slower = []
+    for transport, r in results.items():
+        for case, s in r.items():
+            old = baseline.get(transport, {}).get(case)
+            mark = ""
+            if old is not None and s > old * (1 + args.tolerance):
+                mark = "  SLOWER"
+                slower.append(f"{transport} {case}")
+            ref = f"{old * 1e3:>10.3f}" if old is not None else f"{'-':>10}"
+            print(f"{transport:<10} {case:<28} {s * 1e3:>10.3f} {ref}{mark}", flush=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if slower:
+        print(f"{len(slower)} case(s) regressed beyond {args.tolerance:.0%}: {', '.join(slower)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
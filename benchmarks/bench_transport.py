@@ -0,0 +1,140 @@
+# bench_transport.py — RPyC latency/throughput through each remote_cw transport.
+#
+#   python benchmarks/bench_transport.py [--latency-ms 5] [--calls 500]
+#
+# Modes:
+#   threaded  the old thread-per-connection _Forwarder (kept below as baseline)
+#   forward   local port forward served by the single selector loop
+#   channel   rpyc straight over the paramiko direct-tcpip channel
+from pathlib import Path
+import sys
+
+# Adding parent directory to the path to access utils
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import argparse, select, socket, statistics, threading, time
+from contextlib import contextmanager
+
+import paramiko
+
+import utils.remote_cw as remote_cw_mod
+from utils.remote_cw import remote_cw
+from loopback import LoopbackPi
+
+
+class _ThreadedForwarder(threading.Thread):
+    """Baseline: the forwarder remote_cw shipped with (one pump thread per client, 16 KiB reads)."""
+    def __init__(self, transport: paramiko.Transport, local_addr, remote_addr):
+        super().__init__(daemon=True)
+        self.transport = transport
+        self.local_addr = local_addr
+        self.remote_addr = remote_addr
+        self._running = True
+        self._listen_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._listen_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listen_sock.bind(self.local_addr)
+        self._listen_sock.listen(5)
+
+    def run(self):
+        try:
+            while self._running:
+                r, _, _ = select.select([self._listen_sock], [], [], 1)
+                if self._listen_sock in r:
+                    client, addr = self._listen_sock.accept()
+                    try:
+                        chan = self.transport.open_channel("direct-tcpip", self.remote_addr, addr)
+                    except Exception:
+                        client.close()
+                        continue
+                    threading.Thread(target=self._pump, args=(client, chan), daemon=True).start()
+        finally:
+            try: self._listen_sock.close()
+            except Exception: pass
+
+    def stop(self):
+        self._running = False
+        try:
+            s = socket.socket(); s.connect(self.local_addr); s.close()  # poke select()
+        except Exception:
+            pass
+
+    @staticmethod
+    def _pump(client, chan):
+        try:
+            while True:
+                r, _, _ = select.select([client, chan], [], [])
+                if client in r:
+                    buf = client.recv(16384)
+                    if not buf: break
+                    chan.sendall(buf)
+                if chan in r:
+                    buf = chan.recv(16384)
+                    if not buf: break
+                    client.sendall(buf)
+        finally:
+            try: client.close()
+            finally:
+                try: chan.close()
+                except Exception: pass
+
+
+@contextmanager
+def open_mode(pi: LoopbackPi, mode: str):
+    saved = remote_cw_mod._Forwarder
+    if mode == "threaded":
+        remote_cw_mod._Forwarder = _ThreadedForwarder
+    try:
+        # same steps as remote_cw.__enter__, minus importing chipwhisperer
+        cfg = pi.config(transport="channel" if mode == "channel" else "forward")
+        rcw = remote_cw(cfg)
+        rcw._ssh_connect()
+        if cfg.transport == "forward":
+            rcw._open_tunnel(local_port=cfg.local_port, remote_port=cfg.port)
+        rcw._conn = rcw._rpyc_connect()
+        try:
+            yield rcw._conn
+        finally:
+            rcw.__exit__(None, None, None)
+    finally:
+        remote_cw_mod._Forwarder = saved
+
+
+def bench_latency(conn, calls: int):
+    samples = []
+    for _ in range(calls):
+        t0 = time.perf_counter()
+        conn.eval("42")
+        samples.append(time.perf_counter() - t0)
+    samples.sort()
+    return statistics.median(samples), samples[int(0.99 * (len(samples) - 1))]
+
+
+def bench_throughput(conn, size: int, reps: int):
+    conn.execute(f"_bench_blob = b'x' * {size}")
+    t0 = time.perf_counter()
+    for _ in range(reps):
+        conn.eval("_bench_blob")  # bytes come back by value
+    dt = time.perf_counter() - t0
+    return size * reps / dt / 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="one-way delay added per relayed chunk")
+    ap.add_argument("--calls", type=int, default=500)
+    ap.add_argument("--modes", default="threaded,forward,channel")
+    ap.add_argument("--sizes", default="1024,65536,1048576,8388608")
+    args = ap.parse_args()
+
+    sizes = [int(x) for x in args.sizes.split(",")]
+    print(f"{'mode':<10} {'p50 ms':>8} {'p99 ms':>8}  " + "  ".join(f"{s//1024:>7}KiB MB/s" for s in sizes))
+    with LoopbackPi(latency_s=args.latency_ms / 1000) as pi:
+        for mode in args.modes.split(","):
+            with open_mode(pi, mode) as conn:
+                p50, p99 = bench_latency(conn, args.calls)
+                rates = [bench_throughput(conn, s, reps=max(1, (4 << 20) // s)) for s in sizes]
+            print(f"{mode:<10} {p50*1e3:>8.3f} {p99*1e3:>8.3f}  " + "  ".join(f"{r:>15.1f}" for r in rates), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# check_broker.py — the helpers through an attached broker, end to end on one box.
+#
+#   python benchmarks/check_broker.py
+#
+# Starts LoopbackPi, serves a broker on it (utils.broker.serve) and attaches
+# to it the way a solve script does (RemoteConfig.broker). Then every helper
+# that runs Pi-side remote_ops is called once: cap_pass_trace, with and
+# without repeats, interact, run_script, reset_target and verify_candidates.
+# Exits non-zero on the first one that fails.
+from pathlib import Path
+import sys
+
+# Adding parent directory to the path to access utils
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import os, tempfile, threading, time
+
+import numpy as np
+from rpyc.utils.classic import obtain
+
+from utils import broker
+from utils.remote_cw import remote_cw, bcolors
+from utils.helper_cv import (setup_cw, cap_pass_trace, interact, run_script, reset_target,
+                             verify_candidates)
+from loopback import LoopbackPi
+
+PASSWORD = b"gk1{s1mul4t3}"  # sim_cw's gatekeeper 'a' password
+
+
+def serve_broker(pi: LoopbackPi, socket_path: str, timeout_s: float = 30.0):
+    # serve() blocks in server.start(); the daemon thread dies with the check
+    threading.Thread(target=broker.serve, args=(pi.config(), socket_path), daemon=True).start()
+    deadline = time.time() + timeout_s
+    while not os.path.exists(socket_path):
+        if time.time() > deadline:
+            raise RuntimeError(f"broker did not come up on {socket_path}")
+        time.sleep(0.05)
+
+
+def check(name, ok):
+    tag = f"{bcolors.OKGREEN}ok{bcolors.ENDC}" if ok else f"{bcolors.FAIL}FAILED{bcolors.ENDC}"
+    print(f"{name:<24} {tag}", flush=True)
+    if not ok:
+        sys.exit(1)
+
+
+def main():
+    with LoopbackPi() as pi, tempfile.TemporaryDirectory(prefix="check_broker_") as tmp:
+        socket_path = os.path.join(tmp, "broker.sock")
+        serve_broker(pi, socket_path)
+        with remote_cw(pi.config(broker=socket_path)) as cw:
+            check("attached", type(cw).__name__ == "_BrokerCW")
+            scope, target, _ = setup_cw(cw, cw.scope())
+            cw.program_target(scope, cw.programmers.STM32FProgrammer, "gatekeeper-CWNANO.hex")
+
+            trace = obtain(cap_pass_trace(scope, target, PASSWORD[:5], command="a"))
+            check("cap_pass_trace", np.asarray(trace).shape == (int(scope.adc.samples),))
+            mean, var = cap_pass_trace(scope, target, PASSWORD[:5], command="a", repeats=3)
+            check("cap_pass_trace repeats", len(obtain(mean)) == len(obtain(var)) == len(trace))
+            check("interact", bytes(interact(scope, target, "a", PASSWORD, 18)).startswith(b"Access granted"))
+            responses, traces = run_script(scope, target, "drain; write a 677a; read r 18; drain; arm; "
+                                                          "write a 676b; read r 18; capture")
+            check("run_script", len(responses) == 2 and len(traces) == 1)
+            reset_target(scope)
+            check("reset_target", True)
+            tried, found, _ = verify_candidates(scope, target, "a", [b"gk1{wrong}", PASSWORD], 18,
+                                                accept=rb"^Access granted", verbose=False)
+            check("verify_candidates", (tried, found) == (2, PASSWORD))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+# loopback.py — local stand-ins for the Pi so remote_cw can run end to end on one box:
+#   - a Paramiko SSH server that accepts only the throwaway client key and
+#     honours direct-tcpip, the sftp subsystem and the few exec commands
+#     _CWProxy sends (sha256sum, mkdir -p, $HOME), answered in Python,
+#   - an rpyc_classic server on 127.0.0.1,
+#   - a fake `chipwhisperer` module for it, backed by utils.sim_cw, unless the
+#     real one is installed.
+# The "Pi" filesystem is a temporary directory removed on exit: put_file()
+# lands in <tmp>/remote_files, as it would in /remote_files on the Pi, and
+# nothing outside it is reachable over sftp or exec.
+from pathlib import Path
+import sys
+
+# Adding parent directory to the path to access utils
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import hashlib, importlib.util, os, posixpath, shlex, shutil, socket, tempfile, threading, time, types
+import paramiko
+from rpyc.core.service import ClassicService
+from rpyc.utils.server import ThreadedServer
+
+from utils.remote_cw import RemoteConfig
+from utils.sim_cw import SimCW
+
+
+def start_rpyc_server(port: int = 0) -> ThreadedServer:
+    """rpyc_classic equivalent bound to 127.0.0.1; server.port is the real port."""
+    server = ThreadedServer(ClassicService, hostname="127.0.0.1", port=port,
+                            protocol_config={"allow_pickle": True, "allow_all_attrs": True})
+    threading.Thread(target=server.start, daemon=True).start()
+    return server
+
+
+HOME = "/home/pi"  # what $HOME expands to on the stub
+
+
+def _local(root: str, path: str) -> str:
+    """A Pi path inside `root`: absolute, normalised, no way out through '..'."""
+    return os.path.join(root, posixpath.normpath("/" + path).lstrip("/"))
+
+
+class _StubServer(paramiko.ServerInterface):
+    def __init__(self, owner: "LoopbackSSH"):
+        self.owner = owner
+        self.dest = {}  # chanid -> connected socket
+
+    def get_allowed_auths(self, username):
+        return "publickey"
+
+    def check_auth_publickey(self, username, key):
+        if key == self.owner.client_key:
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def check_channel_request(self, kind, chanid):
+        if kind == "session":
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(target=_run_exec, args=(channel, command, self.owner.root), daemon=True).start()
+        return True
+
+    def check_channel_direct_tcpip_request(self, chanid, origin, destination):
+        # like sshd: connect first, refuse the channel if nobody listens
+        try:
+            sock = socket.create_connection(destination, timeout=5)
+        except OSError:
+            return paramiko.OPEN_FAILED_CONNECT_FAILED
+        sock.settimeout(None)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # the stub itself adds no Nagle stalls
+        self.dest[chanid] = sock
+        return paramiko.OPEN_SUCCEEDED
+
+
+def _exec(root: str, command: str):
+    """(stdout, stderr, status) of one of the commands _CWProxy sends; anything else is refused."""
+    argv = shlex.split(command)
+    if argv[:2] == ["bash", "-lc"] and len(argv) == 3:
+        argv = shlex.split(argv[2])
+    if argv == ["printf", "%s", "$HOME"]:
+        return HOME.encode(), b"", 0
+    if argv[:2] == ["sha256sum", "--"] and len(argv) >= 3:
+        try:
+            with open(_local(root, argv[2]), "rb") as f:
+                return f"{hashlib.sha256(f.read()).hexdigest()}  {argv[2]}\n".encode(), b"", 0
+        except OSError:
+            return b"", b"", 1
+    if argv[:2] == ["mkdir", "-p"] and len(argv) >= 3:
+        path = _local(root, argv[2])
+        try:
+            os.makedirs(path, exist_ok=True)
+        except OSError:
+            return b"", b"", 1
+        if "test" in argv and not os.access(path, os.W_OK):
+            return b"", b"", 1
+        return b"", b"", 0
+    return b"", f"loopback: exec not allowed: {command}\n".encode(), 127
+
+
+def _run_exec(channel, command, root):
+    # EOF rather than close: the answer can be ready before paramiko has sent
+    # the exec request's success reply, and a close ahead of it fails the
+    # client's exec_command. The client closes the channel when it is done.
+    try:
+        stdout, stderr, status = _exec(root, command.decode())
+        channel.sendall(stdout)
+        channel.sendall_stderr(stderr)
+        channel.send_exit_status(status)
+    finally:
+        channel.shutdown_write()
+
+
+class _LocalSFTP(paramiko.SFTPServerInterface):
+    """sftp subsystem over the stub's root directory (what put_file / program_target need)."""
+    def __init__(self, server, *args, **kwargs):
+        super().__init__(server, *args, **kwargs)
+        self.root = server.owner.root
+
+    def _attr(self, st, name=None):
+        attr = paramiko.SFTPAttributes.from_stat(st)
+        if name is not None:
+            attr.filename = name
+        return attr
+
+    def _guard(fn):
+        def wrapped(self, *args):
+            try:
+                return fn(self, *args)
+            except OSError as e:
+                return paramiko.SFTPServer.convert_errno(e.errno)
+        return wrapped
+
+    @_guard
+    def stat(self, path):
+        return self._attr(os.stat(_local(self.root, path)))
+
+    @_guard
+    def lstat(self, path):
+        return self._attr(os.lstat(_local(self.root, path)))
+
+    @_guard
+    def list_folder(self, path):
+        path = _local(self.root, path)
+        return [self._attr(os.lstat(os.path.join(path, n)), n) for n in os.listdir(path)]
+
+    @_guard
+    def open(self, path, flags, attr):
+        fd = os.open(_local(self.root, path), flags, 0o644)
+        mode = "rb" if flags & (os.O_WRONLY | os.O_RDWR) == 0 else ("ab" if flags & os.O_APPEND else ("r+b" if flags & os.O_RDWR else "wb"))
+        handle = paramiko.SFTPHandle(flags)
+        f = os.fdopen(fd, mode)
+        handle.readfile = f
+        handle.writefile = f
+        return handle
+
+    @_guard
+    def remove(self, path):
+        os.remove(_local(self.root, path))
+        return paramiko.SFTP_OK
+
+    @_guard
+    def rename(self, oldpath, newpath):
+        os.rename(_local(self.root, oldpath), _local(self.root, newpath))
+        return paramiko.SFTP_OK
+
+    @_guard
+    def mkdir(self, path, attr):
+        os.mkdir(_local(self.root, path))
+        return paramiko.SFTP_OK
+
+    @_guard
+    def rmdir(self, path):
+        os.rmdir(_local(self.root, path))
+        return paramiko.SFTP_OK
+
+    @_guard
+    def chattr(self, path, attr):
+        if attr.st_mode is not None:
+            os.chmod(_local(self.root, path), attr.st_mode)
+        return paramiko.SFTP_OK
+
+    _guard = staticmethod(_guard)
+
+
+class LoopbackSSH(threading.Thread):
+    """
+    Minimal sshd for `client_key` only, serving the files under `root`;
+    direct-tcpip channels are relayed to their destination. `latency_s`
+    delays every relayed chunk, one way, to emulate a slow link.
+    """
+    def __init__(self, root: str, client_key: paramiko.PKey, latency_s: float = 0.0):
+        super().__init__(daemon=True)
+        self.root = root
+        self.client_key = client_key
+        self.latency_s = latency_s
+        self.host_key = paramiko.RSAKey.generate(2048)
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(("127.0.0.1", 0))
+        self._sock.listen(8)
+        self.port = self._sock.getsockname()[1]
+        self._running = True
+
+    def run(self):
+        while self._running:
+            try:
+                client, _ = self._sock.accept()
+            except OSError:
+                break
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self._serve, args=(client,), daemon=True).start()
+
+    def stop(self):
+        self._running = False
+        try: self._sock.close()
+        except Exception: pass
+
+    def _serve(self, client):
+        t = paramiko.Transport(client)
+        t.add_server_key(self.host_key)
+        t.set_subsystem_handler("sftp", paramiko.SFTPServer, _LocalSFTP)
+        stub = _StubServer(self)
+        t.start_server(server=stub)
+        while t.is_active():
+            chan = t.accept(1)
+            if chan is None:
+                continue
+            dest = stub.dest.pop(chan.get_id(), None)
+            if dest is None:
+                continue  # session channel: exec / sftp threads own it
+            threading.Thread(target=self._relay, args=(chan, dest), daemon=True).start()
+
+    def _relay(self, chan, sock):
+        def pipe(src, dst):
+            try:
+                while True:
+                    buf = src.recv(262144)
+                    if not buf:
+                        break
+                    if self.latency_s:
+                        time.sleep(self.latency_s)
+                    dst.sendall(buf)
+            except (OSError, EOFError):
+                pass
+            finally:
+                for x in (chan, sock):
+                    try: x.close()
+                    except Exception: pass
+        threading.Thread(target=pipe, args=(chan, sock), daemon=True).start()
+        pipe(sock, chan)
+
+
+def fake_chipwhisperer() -> types.ModuleType:
+    """A `chipwhisperer` module whose scope/target are utils.sim_cw objects."""
+    sim = SimCW(verbose=False)
+    mod = types.ModuleType("chipwhisperer")
+    for name in ("scope", "target", "program_target", "set_all_log_levels",
+                 "GlitchController", "logging", "targets", "programmers"):
+        setattr(mod, name, getattr(sim, name))
+    return mod
+
+
+def client_key_file(directory: str):
+    """Throwaway client key in `directory`: (path, key); the stub server accepts only this key."""
+    path = os.path.join(directory, "id_rsa")
+    key = paramiko.RSAKey.generate(2048)
+    key.write_private_key_file(path)
+    return path, key
+
+
+class LoopbackPi:
+    """
+    with LoopbackPi(latency_s=0.005) as pi:
+        with remote_cw(pi.config(transport="forward")) as cw: ...
+    """
+    def __init__(self, latency_s: float = 0.0):
+        self.latency_s = latency_s
+        self.ssh = None
+        self.rpyc = None
+        self.key_filename = None
+        self.tmp = None
+
+    def __enter__(self):
+        # the rpyc server runs in this process, so it imports from our sys.modules
+        if importlib.util.find_spec("chipwhisperer") is None:
+            sys.modules.setdefault("chipwhisperer", fake_chipwhisperer())
+        self.tmp = tempfile.mkdtemp(prefix="loopback_pi_")
+        root = os.path.join(self.tmp, "root")
+        os.makedirs(_local(root, HOME))
+        self.key_filename, key = client_key_file(self.tmp)
+        self.rpyc = start_rpyc_server()
+        self.ssh = LoopbackSSH(root, key, latency_s=self.latency_s)
+        self.ssh.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.ssh.stop()
+        self.rpyc.close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def config(self, **overrides) -> RemoteConfig:
+        kw = dict(host="127.0.0.1", user="pi", key_filename=self.key_filename,
+                  ssh_port=self.ssh.port, port=self.rpyc.port, local_port=_free_port(),
+                  verbose=False)
+        kw.update(overrides)
+        return RemoteConfig(**kw)
+
+
+def _free_port() -> int:
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
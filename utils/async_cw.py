@@ -0,0 +1,94 @@
+# async_cw.py — asyncio front end for remote_cw.
+#
+#   async with AsyncRemoteCW(cfg) as acw:
+#       scope, target, prog = setup_cw(acw.cw, acw.cw.scope())   # sync setup as usual
+#       job = asyncio.create_task(acw.capture(scope, target, b"guess"))
+#       ...                                                       # analyse the previous trace meanwhile
+#       trace, response = await job
+#
+# Calls go out as rpyc async requests on the session's own connection; a
+# background thread serves the replies and resolves the awaiting futures, so
+# the event loop never blocks on the Pi.
+from __future__ import annotations
+import asyncio, pickle
+
+import rpyc
+
+from .remote_cw import remote_cw, RemoteConfig
+
+
+class AsyncRemoteCW:
+    """
+    Async context manager around remote_cw. `acw.cw` is the usual proxy for
+    anything synchronous (setup_cw, scope attributes); capture(), interact(),
+    capture_batch() and put_file() are awaitable.
+    """
+    def __init__(self, config: RemoteConfig):
+        self._session = remote_cw(config)
+        self.cw = None
+        self._bg: rpyc.BgServingThread | None = None
+        self._ops = None
+
+    async def __aenter__(self) -> "AsyncRemoteCW":
+        loop = asyncio.get_running_loop()
+        # SSH + handshake (and queueing for the board) are blocking
+        self.cw = await loop.run_in_executor(None, self._session.__enter__)
+        self._ops = self.cw._remote_ops()
+        self._bg = rpyc.BgServingThread(self.cw._conn)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self._bg:
+            self._bg.stop()
+            self._bg = None
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._session.__exit__, exc_type, exc, tb)
+        self.cw = None
+
+    # ---- awaitable primitives ----
+    async def capture(self, scope, target, data: bytes, command: str = "a", read_bytes: int = 18,
+                      reset: bool = True, platform: str = "CWNANO"):
+        """cap_pass_trace; returns (trace, response), (None, None) on timeout."""
+        return await self.call(self._ops.capture_one, scope, target, bytes(data), command=command,
+                               read_bytes=read_bytes, reset=reset, platform=platform)
+
+    async def capture_batch(self, scope, target, inputs, command: str = "a", read_bytes: int = 18,
+                            reset: bool = True, platform: str = "CWNANO"):
+        """Awaitable cw.capture_batch; returns (traces, responses)."""
+        inputs = tuple(bytes(x) for x in inputs)
+        return await self.call(self._ops.capture_batch, scope, target, inputs, command=command,
+                               read_bytes=read_bytes, reset=reset, platform=platform)
+
+    async def interact(self, scope, target, command: str, data: bytes, bytes_to_read: int = 1):
+        """helper_cv.interact; `scope` is unused, kept for the same signature."""
+        return await self.call(self._ops.interact, target, command, bytes(data), bytes_to_read)
+
+    async def put_file(self, local_path: str, remote_name: str | None = None, mode: int = 0o644) -> str:
+        # SFTP, not RPyC: run the (cached) upload in a worker thread
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.cw.put_file, local_path, remote_name, mode)
+
+    async def call(self, fn, *args, **kwargs):
+        """
+        Await any remote callable. The result is pickled on the Pi and
+        returned by value, so numpy arrays arrive in the same round trip.
+        """
+        res = rpyc.async_(self._ops.call_pickled)(fn, *args, **kwargs)
+        return pickle.loads(await _wrap(res))
+
+
+def _wrap(res: rpyc.AsyncResult) -> asyncio.Future:
+    """asyncio future resolved from the rpyc serving thread."""
+    loop = asyncio.get_running_loop()
+    fut = loop.create_future()
+
+    def settle(r):
+        if fut.cancelled():
+            return
+        try:
+            fut.set_result(r.value)  # ready: re-raises the remote exception, never blocks
+        except Exception as e:
+            fut.set_exception(e)
+
+    res.add_callback(lambda r: loop.call_soon_threadsafe(settle, r))
+    return fut
@@ -0,0 +1,157 @@
+# broker.py — keep one remote_cw session open and let scripts attach to it.
+#
+# Start the broker once (it does SSH, tunnel, RPyC handshake and setup_cw):
+#   python -m utils.broker --host remotechipwhisperer.example --user pi --key ~/.ssh/id_ed25519
+# then point the scripts' RemoteConfig at the socket:
+#   cfg = RemoteConfig(..., broker="/tmp/remote_cw-pi@remotechipwhisperer.example.sock")
+# and `with remote_cw(cfg) as cw:` attaches in milliseconds instead of reconnecting.
+# cw.scope()/cw.target() hand back the broker's already-configured objects, so
+# setup_cw() keeps working unchanged, and the helpers reach the broker's
+# remote_ops (remote_ops_for) through it. One client holds the board at a time.
+from __future__ import annotations
+import argparse, os, threading, time
+from rpyc.utils.classic import obtain
+from rpyc.utils.factory import unix_connect
+from rpyc.utils.helpers import classpartial
+from rpyc.utils.server import ThreadedServer
+from rpyc.core.service import Service
+
+from .remote_cw import remote_cw, RemoteConfig, bcolors, install_remote_ops
+
+# attaching clients read/write attributes of remote objects through the broker
+_PROTOCOL = {
+    "allow_all_attrs": True,
+    "allow_setattr": True,
+    "allow_delattr": True,
+    "allow_pickle": True,
+    "sync_request_timeout": None,
+}
+
+
+def default_socket_path(cfg: RemoteConfig) -> str:
+    return f"/tmp/remote_cw-{cfg.user}@{cfg.host}.sock"
+
+
+class _Held:
+    """The broker's session, shared by every per-connection BrokerService."""
+    def __init__(self, cw, scope, target, prog):
+        self.session = (cw, scope, target, prog)
+        self.lock = threading.Lock()
+        self.holder = None
+
+
+class BrokerService(Service):
+    def __init__(self, held: _Held):
+        self._held = held
+        self._conn = None
+
+    def on_connect(self, conn):
+        self._conn = conn
+
+    def on_disconnect(self, conn):
+        if self._held.holder is conn:
+            self._held.holder = None
+            self._held.lock.release()
+
+    def exposed_acquire(self, timeout: float = 1.0) -> bool:
+        # short waits so the client can keep printing its timer
+        if self._held.holder is self._conn:
+            return True
+        if self._held.lock.acquire(timeout=timeout):
+            self._held.holder = self._conn
+            return True
+        return False
+
+    def exposed_session(self):
+        return self._held.session
+
+    def exposed_remote_ops(self):
+        # remote_ops lives on the Pi's classic connection, which clients cannot reach themselves
+        return install_remote_ops(self._held.session[0]._conn)
+
+
+class _BrokerCW:
+    """
+    What remote_cw.__enter__ returns in broker mode: the broker's _CWProxy,
+    with scope()/target() returning the held objects and put_file() paths
+    made absolute (the broker may run from another directory).
+    """
+    def __init__(self, conn, cw, scope, target):
+        self._conn = conn
+        self._cw = cw
+        self._scope = scope
+        self._target = target
+
+    def scope(self, *args, **kwargs):
+        return self._scope
+
+    def target(self, scope=None, *args, **kwargs):
+        return self._target
+
+    def put_file(self, local_path: str, remote_name: str | None = None, mode: int = 0o644) -> str:
+        return self._cw.put_file(os.path.abspath(local_path), remote_name, mode)
+
+    def capture_batch(self, scope, target, inputs, **kwargs):
+        # the broker's copy of the arrays would come back by reference
+        traces, responses = self._cw.capture_batch(scope, target, tuple(bytes(x) for x in inputs), **kwargs)
+        return obtain(traces), obtain(responses)
+
+    def close(self):
+        self._conn.close()
+
+    def __getattr__(self, name):
+        return getattr(self._cw, name)
+
+
+def attach(socket_path: str, verbose: bool = True) -> _BrokerCW:
+    conn = unix_connect(socket_path, config=_PROTOCOL)
+    start = time.time()
+    warned = False
+    while not conn.root.acquire():
+        if not warned and verbose:
+            print(f"[{bcolors.OKCYAN}remote_cw{bcolors.ENDC}] {bcolors.WARNING}Broker busy — another script is attached.{bcolors.ENDC}", flush=True)
+            warned = True
+        if verbose:
+            print(f"\r{bcolors.OKBLUE}[waiting]{bcolors.ENDC} {int(time.time() - start):>4}s", end="", flush=True)
+    if warned:
+        print()
+    cw, scope, target, _ = conn.root.session()
+    if verbose:
+        print(f"[{bcolors.OKCYAN}remote_cw{bcolors.ENDC}] {bcolors.OKGREEN}Attached to broker {socket_path}.{bcolors.ENDC}", flush=True)
+    return _BrokerCW(conn, cw, scope, target)
+
+
+def serve(cfg: RemoteConfig, socket_path: str):
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    from .helper_cv import setup_cw  # matplotlib et al.; attaching clients don't need it
+    with remote_cw(cfg) as cw:
+        scope, target, prog = setup_cw(cw, cw.scope())
+        service = classpartial(BrokerService, _Held(cw, scope, target, prog))
+        server = ThreadedServer(service, socket_path=socket_path,
+                                protocol_config=_PROTOCOL)
+        print(f"[{bcolors.OKCYAN}broker{bcolors.ENDC}] Serving {cfg.user}@{cfg.host} on {socket_path}", flush=True)
+        try:
+            server.start()
+        finally:
+            server.close()
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", required=True)
+    ap.add_argument("--user", default="pi")
+    ap.add_argument("--key", dest="key_filename")
+    ap.add_argument("--port", type=int, default=18812)
+    ap.add_argument("--transport", default="channel")
+    ap.add_argument("--socket")
+    args = ap.parse_args()
+    cfg = RemoteConfig(host=args.host, user=args.user, key_filename=args.key_filename,
+                       port=args.port, transport=args.transport)
+    serve(cfg, args.socket or default_socket_path(cfg))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# capture_cache.py — serve repeated captures from disk.
+#
+#   cache = CaptureCache("cache/gatekeeper", firmware="gateKeeper-CWNANO.hex")
+#   ref = obtain(cap_pass_trace(scope, target, guess, command="a", cache=cache))
+#   cap_pass_trace(..., cache=cache, fresh=True)   # bypass and refresh the entry
+#
+# Key: sha256 of (firmware digest, command, payload, reset, read_bytes,
+# repeats/reduce, scope settings). The settings are read on every lookup, one
+# round trip next to a capture's several, so a scope.adc.samples or
+# scope.io.clkout set by hand never hits traces taken with the old value.
+# Each key holds up to `per_key` traces: the first `per_key` calls capture,
+# later calls rotate through the stored ones.
+# Traces older than `max_age_s` are dropped on lookup; beyond `max_keys`
+# entries the least recently used key file is evicted.
+from __future__ import annotations
+import hashlib, json, os, time
+import numpy as np
+
+from .remote_cw import _sha256_file
+from .trace_store import scope_settings
+
+
+class CaptureCache:
+    def __init__(self, path: str, firmware: str, per_key: int = 1, max_age_s: float | None = None,
+                 max_keys: int = 4096):
+        """`firmware`: the local .hex the target was flashed with (or its sha256)."""
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.firmware = firmware if not os.path.isfile(firmware) else _sha256_file(firmware)
+        self.per_key = per_key
+        self.max_age_s = max_age_s
+        self.max_keys = max_keys
+        self._served: dict[str, int] = {}
+
+    def key(self, scope, command: str, payload: bytes, **params) -> str:
+        desc = {
+            "firmware": self.firmware,
+            "command": command,
+            "payload": bytes(payload).hex(),
+            "scope": scope_settings(scope),
+            **params,
+        }
+        return hashlib.sha256(json.dumps(desc, sort_keys=True).encode()).hexdigest()
+
+    def get(self, key: str) -> np.ndarray | None:
+        """A stored trace, or None when the key still needs captures."""
+        entry = self._load(key)
+        if entry is None:
+            return None
+        traces, stamps = entry
+        if self.max_age_s is not None:
+            keep = stamps >= time.time() - self.max_age_s
+            if not keep.all():
+                traces, stamps = traces[keep], stamps[keep]
+                self._save(key, traces, stamps)
+        if len(traces) < self.per_key:
+            return None
+        i = self._served.get(key, 0)
+        self._served[key] = i + 1
+        os.utime(self._file(key))  # LRU
+        return traces[i % len(traces)]
+
+    def put(self, key: str, trace) -> None:
+        trace = np.asarray(trace, dtype=float)
+        entry = self._load(key)
+        if entry is None:
+            traces, stamps = trace[None], np.array([time.time()])
+        else:
+            # oldest out once the key holds per_key traces
+            traces = np.concatenate([entry[0], trace[None]])[-self.per_key:]
+            stamps = np.append(entry[1], time.time())[-self.per_key:]
+        self._save(key, traces, stamps)
+        self._evict()
+
+    def clear(self) -> None:
+        for name in os.listdir(self.path):
+            if name.endswith(".npz"):
+                os.remove(os.path.join(self.path, name))
+        self._served.clear()
+
+    # -------- helpers --------
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, f"{key}.npz")
+
+    def _load(self, key: str):
+        try:
+            with np.load(self._file(key)) as f:
+                return f["traces"], f["stamps"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _save(self, key: str, traces, stamps) -> None:
+        tmp = self._file(key) + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, traces=traces, stamps=stamps)
+        os.replace(tmp, self._file(key))
+
+    def _evict(self) -> None:
+        files = [os.path.join(self.path, n) for n in os.listdir(self.path) if n.endswith(".npz")]
+        if len(files) <= self.max_keys:
+            return
+        files.sort(key=os.path.getmtime)
+        for f in files[:len(files) - self.max_keys]:
+            os.remove(f)
@@ -0,0 +1,216 @@
+# cpa.py — correlation power analysis, all guesses at once.
+#
+#   values = as_bytes(textin)                                    # (N, 16) uint8
+#   res = cpa(traces[:, 0:160], hypotheses(values[:, 0]))        # one key byte
+#   res.best, res.ranks[:5], res.peak[res.best], res.corr.shape   # (256, 160)
+#   results = cpa_bytes(traces, values, windows=[slice(160*k, 160*(k+1)) for k in range(12)], columns=[0]*12)
+#   rank_table(results)                                          # (bytes, 256) guesses, best first
+#
+#   live = [RunningCPA(byte_model(k), window=slice(160*k, 160*(k+1))) for k in range(12)]
+#   stop = EarlyStop(live, stable=5)
+#   def consume(inputs, traces, done, total):
+#       for c in live: c.update(inputs, traces)
+#       return stop()                        # True ends the capture (capture_pipeline / capture_into)
+#
+# The (N, 256) hypothesis matrix comes from a lookup table indexed with
+# value ^ guess; traces and hypotheses are centred once and the whole
+# (256, samples) Pearson matrix is a single float32 matrix product.
+from __future__ import annotations
+from dataclasses import dataclass
+
+import numpy as np
+
+from .leakage import HW, guess_xor
+
+TIE = 1 - 1e-5  # peaks this close to the best count as tied with it
+
+
+def as_bytes(inputs) -> np.ndarray:
+    """Inputs (bytes per trace, or ints for one-byte inputs) as an (N, len) uint8 array."""
+    inputs = list(inputs)
+    if inputs and isinstance(inputs[0], (int, np.integer)):
+        return np.asarray(inputs, dtype=np.uint8)[:, None]
+    return np.frombuffer(b"".join(bytes(x) for x in inputs), dtype=np.uint8).reshape(len(inputs), -1)
+
+
+def hypotheses(values, table=HW, guesses: int = 256) -> np.ndarray:
+    """(N, guesses) predicted leakage table[value ^ guess] for a column of input bytes."""
+    return table[guess_xor(values, guesses=guesses)]
+
+
+def correlate(traces, hyp, dtype=np.float32) -> np.ndarray:
+    """
+    (guesses, samples) Pearson correlation of each hypothesis column with each
+    sample; 0 where undefined. Rows with a NaN (timed-out captures) are left out.
+    """
+    t = np.asarray(traces, dtype=dtype)
+    h = np.asarray(hyp, dtype=dtype)
+    keep = ~np.isnan(t).any(axis=1)
+    if not keep.all():
+        t, h = t[keep], h[keep]
+    t = t - t.mean(axis=0)
+    h = h - h.mean(axis=0)
+    num = h.T @ t
+    den = np.outer(np.sqrt((h * h).sum(axis=0)), np.sqrt((t * t).sum(axis=0)))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(den > 0, num / den, 0).astype(dtype, copy=False)
+
+
+@dataclass
+class CPAResult:
+    corr: np.ndarray     # (guesses, samples)
+    peak: np.ndarray     # (guesses,) max |corr| over samples
+    peak_at: np.ndarray  # (guesses,) sample index of that max
+    ranks: np.ndarray    # guesses, best first
+
+    @property
+    def best(self) -> int:
+        return int(self.ranks[0])
+
+    @property
+    def margin(self) -> float:
+        """
+        Peak of the best guess minus the runner-up's. Exact ties with the best
+        are skipped: under HW, k and k ^ 0xff always score the same |corr|.
+        """
+        best = self.peak[self.ranks[0]]
+        rest = self.peak[self.ranks][self.peak[self.ranks] < best * TIE]
+        return float(best - rest[0]) if len(rest) else 0.0
+
+    def candidates(self, ratio: float = 0.95) -> np.ndarray:
+        """Guesses whose peak is within `ratio` of the best one."""
+        return np.where(self.peak > ratio * self.peak[self.best])[0]
+
+
+def cpa(traces, hyp, dtype=np.float32) -> CPAResult:
+    return _result(correlate(traces, hyp, dtype))
+
+
+def _result(corr) -> CPAResult:
+    a = np.abs(corr)
+    peak_at = a.argmax(axis=1)
+    peak = a[np.arange(len(a)), peak_at]
+    return CPAResult(corr=corr, peak=peak, peak_at=peak_at, ranks=np.argsort(-peak, kind="stable"))
+
+
+def cpa_bytes(traces, values, windows, columns=None, table=HW, xor=None, dtype=np.float32,
+              model=None) -> list[CPAResult]:
+    """
+    One CPA per key byte k: samples traces[:, windows[k]] (a slice or index
+    array) against hypotheses of values[:, columns[k]] (default k), each
+    XORed with xor[k] first when given (a chained stage, e.g. t ^ key ^ guess).
+    Hypotheses are table[v ^ guess], or model(v) -> (N, guesses) built from
+    utils.leakage, e.g. model=lambda v: hw(sbox(guess_xor(v))).
+    Traces with a NaN (timed-out captures) are dropped with their inputs.
+    """
+    traces = np.asarray(traces)
+    values = np.asarray(values, dtype=np.uint8)
+    keep = ~np.isnan(traces).any(axis=1) if traces.dtype.kind == "f" else np.ones(len(traces), dtype=bool)
+    if not keep.all():
+        traces, values = traces[keep], values[keep]
+    columns = range(len(windows)) if columns is None else columns
+    hyps = []
+    for k, (_, col) in enumerate(zip(windows, columns)):
+        v = values[:, col] if xor is None else values[:, col] ^ np.uint8(xor[k])
+        hyps.append(hypotheses(v, table) if model is None else np.asarray(model(v)))
+    out = []
+    for window, hyp in zip(windows, hyps):
+        t = traces[:, window]
+        out.append(cpa(t.reshape(len(t), -1), hyp, dtype))
+    return out
+
+
+def rank_table(results) -> np.ndarray:
+    """(bytes, guesses): each key byte's guesses, best first."""
+    return np.stack([r.ranks for r in results])
+
+
+def byte_model(column: int, table=HW, guesses: int = 256, model=None):
+    """RunningCPA model: table[inputs[:, column] ^ guess], or model(inputs[:, column]) (see cpa_bytes)."""
+    if model is not None:
+        return lambda p: model(p[:, column])
+    return lambda p: hypotheses(p[:, column], table, guesses)
+
+
+class RunningCPA:
+    """
+    Pearson correlation of every key guess against every sample, kept as
+    running sums (n, Σt, Σt², Σh, Σh², Σht) so it can be read after any
+    update. `model(inputs)` maps an (N, len) uint8 array of inputs to an
+    (N, guesses) array of predicted leakage; `window` picks the sample
+    columns of each trace to keep. update() skips NaN (timed-out) traces.
+    """
+    def __init__(self, model, window=slice(None)):
+        self.model = model
+        self.window = window
+        self.n = 0
+        self._t = self._t2 = self._h = self._h2 = self._ht = 0
+
+    def update(self, inputs, traces):
+        traces = np.asarray(traces, dtype=float)
+        if traces.ndim == 1:
+            traces = traces[None]
+        traces = traces[:, self.window].reshape(len(traces), -1)
+        keep = ~np.isnan(traces).any(axis=1)
+        if not keep.any():
+            return
+        p = inputs if isinstance(inputs, np.ndarray) else as_bytes(inputs)
+        t = traces[keep]
+        h = np.asarray(self.model(p[keep]), dtype=float)
+        self.n += len(t)
+        self._t = self._t + t.sum(axis=0)
+        self._t2 = self._t2 + (t * t).sum(axis=0)
+        self._h = self._h + h.sum(axis=0)
+        self._h2 = self._h2 + (h * h).sum(axis=0)
+        self._ht = self._ht + h.T @ t
+
+    def corr(self) -> np.ndarray:
+        """(guesses, samples) correlation matrix; zero where undefined."""
+        n = self.n
+        num = n * self._ht - np.outer(self._h, self._t)
+        den = np.sqrt(np.outer(n * self._h2 - self._h ** 2, n * self._t2 - self._t ** 2))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.nan_to_num(num / den)
+
+    def result(self) -> CPAResult:
+        return _result(self.corr())
+
+    def max_corr(self) -> np.ndarray:
+        """max |corr| over samples, per guess."""
+        return np.abs(self.corr()).max(axis=1)
+
+    def ranks(self) -> np.ndarray:
+        """Guesses ordered best first."""
+        return np.argsort(-self.max_corr(), kind="stable")
+
+
+class EarlyStop:
+    """
+    Call after each update of `cpas`; returns True once every accumulator's
+    best guess (with its exact ties, which rounding reorders between
+    updates) has stayed the same, with a margin over the runner-up of at
+    least z / sqrt(n) (the noise floor of a correlation estimate), for
+    `stable` calls in a row and at least `min_traces` traces.
+    """
+    def __init__(self, cpas, stable: int = 5, z: float = 1.0, min_traces: int = 50):
+        self.cpas = list(cpas)
+        self.stable = stable
+        self.z = z
+        self.min_traces = min_traces
+        self.streak = 0
+        self.results: list[CPAResult] = []
+        self._best = None
+
+    def __call__(self) -> bool:
+        self.results = [c.result() for c in self.cpas]
+        best = [frozenset(r.candidates(TIE).tolist()) for r in self.results]
+        n = min(c.n for c in self.cpas)
+        clear = n >= self.min_traces and all(r.margin >= self.z / np.sqrt(n) for r in self.results)
+        if not clear:
+            self.streak = 0
+        elif best == self._best:
+            self.streak += 1
+        else:
+            self.streak = 1
+        self._best = best
+        return self.streak >= self.stable
@@ -1,13 +1,20 @@
 import time
-import matplotlib.pyplot as plt
-import os
+import os, pickle
+from itertools import islice
+from rpyc.utils.classic import obtain
+
+from .remote_cw import remote_ops_for
+from .scope_config import apply_config, DEFAULT_SETUP
 
 SCOPETYPE = 'CWNANO'
 PLATFORM = 'CWNANO'
 
 
-def setup_cw(cw,scope):
-    
+def setup_cw(cw,scope, config=None, default_setup=True):
+    # config: a utils.scope_config.ScopeConfig or profile name ("glitch-24MHz", "cpa-7.5MHz").
+    # It is applied as a diff in one round trip, after default_setup() unless the
+    # scope already matches DEFAULT_SETUP or the config (see utils/scope_config.py).
+    # default_setup=False never runs default_setup().
     try:
         if not scope.connectStatus:
             scope.con()
@@ -48,83 +55,107 @@ def setup_cw(cw,scope):
     else:
         prog = None
 
-    time.sleep(0.05)
-    scope.default_setup()
-    
+    if config is None:
+        if default_setup:
+            time.sleep(0.05)
+            scope.default_setup()
+    else:
+        apply_config(scope, target, config, base=DEFAULT_SETUP, default_setup=default_setup)
+
     #scope.clock.adc_freq = 16000000
 
     return scope, target, prog
 
 def reset_target(scope):
-    if PLATFORM == "CW303" or PLATFORM == "CWLITEXMEGA":
-        scope.io.pdic = 'low'
-        time.sleep(0.1)
-        scope.io.pdic = 'high_z' #XMEGA doesn't like pdic driven high
-        time.sleep(0.1) #xmega needs more startup time
-    elif "neorv32" in PLATFORM.lower():
-        raise IOError("Default iCE40 neorv32 build does not have external reset - reprogram device to reset")
-    elif PLATFORM == "CW308_SAM4S" or PLATFORM == "CWHUSKY":
-        scope.io.nrst = 'low'
-        time.sleep(0.25)
-        scope.io.nrst = 'high_z'
-        time.sleep(0.25)
-    else:  
-        scope.io.nrst = 'low'
-        time.sleep(0.05)
-        scope.io.nrst = 'high_z'
-        time.sleep(0.05)
-
-def cap_pass_trace(scope, target, pass_guess: bytes, command: str = "a", verbose: bool = False, read_bytes: int = 18, reset: bool = True):
-    if reset:
-        reset_target(scope)
-    num_char = target.in_waiting()
-    while num_char > 0:
-        target.read(num_char, 10)
-        time.sleep(0.01)
-        num_char = target.in_waiting()
-
-    scope.arm()
-    target.simpleserial_write(command, pass_guess) 
-    response = target.simpleserial_read('r', read_bytes, timeout=50)
+    remote_ops_for(scope).reset_target(scope, PLATFORM)
+
+def cap_pass_trace(scope, target, pass_guess: bytes, command: str = "a", verbose: bool = False, read_bytes: int = 18, reset: bool = True,
+                   repeats: int = 1, reduce: str = "mean", cache=None, fresh: bool = False):
+    # reset/flush/arm/write/read/capture run on the Pi in one round trip.
+    # repeats > 1: K captures reduced ("mean"/"median") on the Pi, returns (trace, per-sample variance)
+    # cache: a utils.capture_cache.CaptureCache; hits come from disk, fresh=True recaptures
+    if cache is not None:
+        key = cache.key(scope, command, pass_guess, reset=reset, read_bytes=read_bytes, repeats=repeats, reduce=reduce)
+        hit = None if fresh else cache.get(key)
+        if hit is not None:
+            return tuple(hit) if repeats > 1 else hit
+    ops = remote_ops_for(target)
+    if repeats > 1:
+        trace, response = ops.averaged_capture(scope, target, command, bytes(pass_guess), read_bytes, repeats=repeats,
+                                               reduce=reduce, reset=reset, platform=PLATFORM)
+    else:
+        trace, response = ops.transaction(scope, target, command, bytes(pass_guess), read_bytes,
+                                          reset=reset, platform=PLATFORM)
     if verbose:
         print(f"[+] Response: {response}")
-    ret = scope.capture()
-    if ret:
+    if trace is None:
         print('Timeout happened during acquisition')
         return None
-
-    trace = scope.get_last_trace()
+    if cache is not None:
+        trace = obtain(trace)
+        cache.put(key, trace)
     return trace
 
 def interact(scope, target, command: str, pass_guess: bytes, bytes_to_read: int = 1):
-    num_char = target.in_waiting()
-    while num_char > 0:
-        target.read(num_char, 10)
-        time.sleep(0.01)
-        num_char = target.in_waiting()
-    target.simpleserial_write(command, pass_guess) 
-    response = target.simpleserial_read('r', bytes_to_read)
+    _, response = remote_ops_for(target).transaction(scope, target, command, bytes(pass_guess), bytes_to_read,
+                                                     capture=False, compute_ms=250)
     return response
 
-        
-def plot_traces(traces, filename="palle.png"):
-    os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
-
-    fig = plt.figure(figsize=(50, 4))
-    ax = fig.add_subplot(111)
-
-    ax.plot(traces[0], label="Trace 1", linewidth=1.5)
-    ax.plot(traces[1], label="Trace 2", linewidth=1.5, alpha=0.6)
-
-    ax.set_title("Confronto tra due tracce di acquisizione", pad=12)
-    ax.legend(loc="upper right", fontsize=10)
-    ax.set_xlabel("Campioni")
-    ax.set_ylabel("Ampiezza del segnale")
-    ax.grid(True, linestyle="--", alpha=0.4)
+def run_script(scope, target, script):
+    # several dependent SimpleSerial steps in one round trip, e.g.
+    #   "drain; write x; read r 1; drain; arm; write p 02000000; read r 1 50; capture"
+    # returns (responses, traces) already local; see remote_ops.run_script for the steps
+    ops = remote_ops_for(target)
+    if not isinstance(script, str):
+        script = tuple(tuple(bytes(a) if isinstance(a, (bytes, bytearray)) else a for a in step) for step in script)
+    return pickle.loads(ops.call_pickled(ops.run_script, scope, target, script, PLATFORM))
+
+def interact_then_capture(scope, target, pre_cmd: str, pre_data: bytes, pre_len: int, cmd: str, data: bytes,
+                          read_bytes: int, pre_ms: float = 250, compute_ms: float = 50):
+    # interact(pre_cmd, pre_data) then cap_pass_trace(cmd, data, reset=False), as one run_script on the Pi.
+    # pre_len / read_bytes are the firmware's reply lengths, so neither read waits out its timeout.
+    _, (trace,) = run_script(scope, target, (("drain",), ("write", pre_cmd, bytes(pre_data)), ("read", "r", pre_len, pre_ms),
+                                             ("drain",), ("arm",), ("write", cmd, bytes(data)), ("read", "r", read_bytes, compute_ms),
+                                             ("capture",)))
+    return trace
 
-    fig.tight_layout()
-    fig.savefig(filename, dpi=300)
-    plt.close(fig) # oom fix
+def verify_candidates(scope, target, command: str, candidates, read_bytes: int, accept=None, reject=(),
+                      compute_ms: float = 250, limit: int | None = None, batch: int = 8, max_batch: int = 1024,
+                      verbose: bool = True):
+    # candidates: any iterable of payloads, e.g. a generator of key guesses; it is pulled in batches
+    # (doubling up to max_batch) and each batch is tried on the Pi, which stops at the first reply that
+    # passes: accept = regex the reply must match, reject = replies that mean "wrong" (b'deadlyWhiteJade!!').
+    # One round trip per batch instead of per candidate. Returns (tried, candidate, response);
+    # candidate/response are None if nothing passed within `limit` candidates.
+    ops = remote_ops_for(target)
+    candidates = iter(candidates)
+    reject = tuple(bytes(r) for r in ([reject] if isinstance(reject, (bytes, bytearray)) else reject))
+    tried = 0
+    while limit is None or tried < limit:
+        n = batch if limit is None else min(batch, limit - tried)
+        chunk = tuple(bytes(c) for c in islice(candidates, n))
+        if not chunk:
+            break
+        done, found, response = ops.verify_candidates(scope, target, command, chunk, read_bytes, accept, reject,
+                                                      compute_ms, platform=PLATFORM)
+        tried += done
+        if verbose:
+            print(f"[+] Tried {tried} candidates")
+        if found is not None:
+            return tried, bytes(found), bytes(response)
+        batch = min(batch * 2, max_batch)
+    return tried, None, None
+
+
+def plot_traces(traces, filename="palle.png", plotter=None):
+    # plotter: a utils.plotting.Plotter to draw in the background instead of here.
+    # Either way traces are min/max downsampled first and Matplotlib is only imported when drawing.
+    from .plotting import draw_traces
+    os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+    traces = [obtain(traces[0]), obtain(traces[1])]
+    if plotter is not None:
+        return plotter.traces(filename, traces)
+    draw_traces(filename, traces) # closes the figure (oom fix)
 
 def reboot_flush(scope, target):
     reset_target(scope)
@@ -133,6 +164,7 @@ def reboot_flush(scope, target):
 
 def upload_firmware(cw, scope, prog, challenge_name):
 
-    cw.put_file("{}-{}.hex".format(challenge_name, PLATFORM), "{}-{}.hex".format(challenge_name, PLATFORM))
-    cw.program_target(scope, prog, "/home/pi/remote_files/{}-{}.hex".format(challenge_name, PLATFORM))
+    # both steps are no-ops when the Pi / target already have this exact hex
+    fw_path = cw.put_file("{}-{}.hex".format(challenge_name, PLATFORM), "{}-{}.hex".format(challenge_name, PLATFORM))
+    cw.program_target(scope, prog, fw_path)
     print("[+] Programmed target with {}-{}.hex".format(challenge_name, PLATFORM))
\ No newline at end of file
@@ -0,0 +1,160 @@
+# instrument.py — where does the time per trace go?
+#
+# Opt in with RemoteConfig(instrument=True): every RPyC request on the session
+# is counted, timed and its bytes on the wire tallied, attributed to
+#   helper: the innermost utils function (reset_target, drain, cap_pass_trace,
+#           capture_batch, …), rpyc's obtain, or <script> for the caller's code
+#   call:   what was asked of the Pi (arm(), simpleserial_write(), .adc, …)
+# The table is printed when the session closes; for a per-campaign breakdown:
+#   cw.rpc_stats.reset()
+#   ... capture loop ...
+#   print(cw.rpc_stats.table(traces=N))
+from __future__ import annotations
+import os, sys, threading, time
+from collections import defaultdict
+
+from rpyc.core import consts
+
+_HERE = os.path.abspath(__file__)
+_UTILS = os.path.dirname(_HERE) + os.sep
+_HANDLERS = {v: k[len("HANDLE_"):].lower() for k, v in vars(consts).items() if k.startswith("HANDLE_")}
+
+
+class _Row:
+    __slots__ = ("requests", "wall_s", "bytes_out", "bytes_in")
+
+    def __init__(self):
+        self.requests = 0
+        self.wall_s = 0.0
+        self.bytes_out = 0
+        self.bytes_in = 0
+
+
+class RpcStats:
+    def __init__(self):
+        self._rows: dict[tuple[str, str], _Row] = defaultdict(_Row)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def reset(self):
+        with self._lock:
+            self._rows.clear()
+
+    def rows(self) -> dict[tuple[str, str], _Row]:
+        with self._lock:
+            return dict(self._rows)
+
+    def table(self, traces: int | None = None) -> str:
+        """Summary, slowest first. With `traces`, adds a per-trace time column."""
+        rows = sorted(self.rows().items(), key=lambda kv: -kv[1].wall_s)
+        total = _Row()
+        for _, r in rows:
+            total.requests += r.requests
+            total.wall_s += r.wall_s
+            total.bytes_out += r.bytes_out
+            total.bytes_in += r.bytes_in
+        head = f"{'helper':<18} {'call':<24} {'reqs':>7} {'time ms':>10} {'ms/req':>8} {'out B':>10} {'in B':>10}"
+        if traces:
+            head += f" {'ms/trace':>9}"
+        lines = [head, "-" * len(head)]
+        for (helper, call), r in rows + [(("total", ""), total)]:
+            line = (f"{helper:<18} {call:<24} {r.requests:>7} {r.wall_s * 1e3:>10.1f} "
+                    f"{r.wall_s * 1e3 / max(r.requests, 1):>8.2f} {r.bytes_out:>10} {r.bytes_in:>10}")
+            if traces:
+                line += f" {r.wall_s * 1e3 / traces:>9.2f}"
+            if helper == "total":
+                lines.append("-" * len(head))
+            lines.append(line)
+        return "\n".join(lines)
+
+    # ---- hooks, see instrument() ----
+    def _key(self) -> tuple[str, str] | None:
+        return getattr(self._local, "key", None)
+
+    def _add(self, key, **fields):
+        with self._lock:
+            row = self._rows[key or ("<background>", "")]
+            for name, value in fields.items():
+                setattr(row, name, getattr(row, name) + value)
+
+
+class _CountingChannel:
+    """rpyc Channel stand-in that tallies bytes (Channel has __slots__, so wrap rather than patch)."""
+    def __init__(self, channel, stats: RpcStats):
+        self._channel = channel
+        self._stats = stats
+
+    def send(self, data):
+        self._stats._add(self._stats._key(), bytes_out=len(data))
+        return self._channel.send(data)
+
+    def recv(self):
+        data = self._channel.recv()
+        self._stats._add(self._stats._key(), bytes_in=len(data))
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._channel, name)
+
+
+def instrument(conn, stats: RpcStats | None = None) -> RpcStats:
+    """Start counting on an rpyc Connection; returns the RpcStats collecting it."""
+    stats = stats or RpcStats()
+    conn._channel = _CountingChannel(conn._channel, stats)
+    sync_request = conn.sync_request
+    async_request = conn._async_request
+
+    def timed_sync_request(handler, *args):
+        outer = stats._key()
+        key = outer or (_caller(), _describe(stats, handler, args))
+        stats._local.key = key
+        start = time.perf_counter()
+        try:
+            return sync_request(handler, *args)
+        finally:
+            stats._local.key = outer
+            if outer is None:
+                stats._add(key, wall_s=time.perf_counter() - start)
+
+    def counted_async_request(handler, args=(), callback=(lambda a, b: None)):
+        outer = stats._key()
+        key = outer or (_caller(), _describe(stats, handler, args))
+        stats._local.key = key
+        try:
+            return async_request(handler, args, callback)
+        finally:
+            stats._local.key = outer
+            stats._add(key, requests=1)
+
+    conn.sync_request = timed_sync_request
+    conn._async_request = counted_async_request
+    return stats
+
+
+def _describe(stats: RpcStats, handler, args) -> str:
+    name = _HANDLERS.get(handler, str(handler))
+    if handler == consts.HANDLE_CALLATTR:
+        return f"{args[1]}()"
+    if handler == consts.HANDLE_GETATTR:
+        stats._local.attr = args[1]  # `scope.arm()` is a getattr, then a call on the bound method
+        return f".{args[1]}"
+    if handler == consts.HANDLE_CALL:
+        attr, stats._local.attr = getattr(stats._local, "attr", None), None
+        return f"{attr}()" if attr else name
+    if handler == consts.HANDLE_SETATTR:
+        return f".{args[1]} ="
+    return name
+
+
+def _caller() -> str:
+    f = sys._getframe(2)
+    while f is not None:
+        path = f.f_code.co_filename
+        if f.f_globals.get("__name__") == "rpyc.utils.classic":
+            return f.f_code.co_name
+        if path.startswith(_UTILS) and path != _HERE:
+            return f.f_code.co_name
+        if not f.f_globals.get("__name__", "").startswith("rpyc"):
+            return "<script>"
+        f = f.f_back
+    return "<script>"
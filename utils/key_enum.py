@@ -0,0 +1,117 @@
+# key_enum.py — try full keys in decreasing likelihood instead of product() order.
+#
+#   logp = log_probs(results, n=len(traces))        # (bytes, 256) per-byte log-probabilities
+#   print(effort(logp))                             # expected trials, trials for 50/90/99% success
+#   for key, score in enumerate_keys(logp):         # most likely key first
+#       ...
+#   merge_keys(enumerate_keys(log_probs(results, n, sign=+1)),   # leakage sign unknown: both
+#              enumerate_keys(log_probs(results, n, sign=-1)))
+#   rank_estimate(logp, known_key)                  # (low, estimate, high) rank of a key
+#
+# log_probs turns each byte's CPA peaks into a posterior over guesses: with
+# n traces the Fisher z of a correlation, s = sqrt(n - 3) * atanh(|rho|), is
+# about N(0, 1) for a wrong guess and N(mu, 1) for the right one, which makes
+# log P(guess) = mu * s - logsumexp(mu * s), mu estimated by the best s.
+# Bytes are independent, so a key's log-probability is the sum over bytes.
+#
+# enumerate_keys is the optimal best-first enumeration: each byte's guesses
+# sorted by probability, a heap of index vectors starting from (0, ..., 0),
+# and every vector pushed once (by the vector that differs only in its last
+# non-zero index), so keys come out exactly in order. The heap holds at most
+# `bytes` entries per key emitted. rank_estimate / effort convolve per-byte
+# histograms of the log-probabilities (histogram key-rank estimation), so
+# they cost the same for 2^8 or 2^128 keys.
+from __future__ import annotations
+import heapq
+
+import numpy as np
+
+
+def log_probs(results, n: int, sign: int | None = None) -> np.ndarray:
+    """
+    (bytes, guesses) log-probability of each guess from CPAResults over n
+    traces. sign=+1/-1 scores max(sign * corr) instead of max |corr|: under HW
+    k and k ^ 0xff only differ in the sign of their correlation, which is the
+    same for every byte leaked by the same instruction.
+    """
+    if sign is None:
+        peaks = np.stack([np.asarray(r.peak, dtype=float) for r in results])
+    else:
+        peaks = np.stack([(sign * np.asarray(r.corr, dtype=float)).max(axis=1) for r in results])
+    s = np.sqrt(max(n - 3, 1)) * np.arctanh(np.clip(peaks, 0, 1 - 1e-9))
+    a = s.max(axis=1, keepdims=True) * s
+    a -= a.max(axis=1, keepdims=True)
+    return a - np.log(np.exp(a).sum(axis=1, keepdims=True))
+
+
+def enumerate_keys(logp, limit: int | None = None):
+    """Yield (key, log-probability), key a tuple of guesses, most likely first; at most `limit` keys."""
+    logp = np.asarray(logp, dtype=float)
+    order = np.argsort(-logp, axis=1, kind="stable")
+    ranked = np.take_along_axis(logp, order, axis=1)
+    m, g = ranked.shape
+    start = (0,) * m
+    heap = [(-ranked[np.arange(m), start].sum(), start)]
+    emitted = 0
+    while heap and (limit is None or emitted < limit):
+        neg, idx = heapq.heappop(heap)
+        yield tuple(int(order[j, i]) for j, i in enumerate(idx)), -neg
+        emitted += 1
+        last = max((j for j in range(m) if idx[j]), default=0)
+        for j in range(last, m):
+            if idx[j] + 1 < g:
+                child = idx[:j] + (idx[j] + 1,) + idx[j + 1:]
+                heapq.heappush(heap, (neg + ranked[j, idx[j]] - ranked[j, idx[j] + 1], child))
+
+
+def merge_keys(*streams):
+    """Merge enumerate_keys streams (e.g. one per leakage-sign hypothesis) into one, most likely first, without repeats."""
+    seen = set()
+    for key, score in heapq.merge(*streams, key=lambda item: -item[1]):
+        if key not in seen:
+            seen.add(key)
+            yield key, score
+
+
+def _histograms(logp, bins: int, floor: float):
+    # per-byte counts on one grid of width w, convolved: counts[b] keys with total log-probability ~ b*w + m*floor
+    logp = np.maximum(np.asarray(logp, dtype=float), floor)
+    w = -floor / (bins - 1)
+    idx = np.rint((logp - floor) / w).astype(int)
+    total = np.ones(1)
+    for row in idx:
+        total = np.convolve(total, np.bincount(row, minlength=bins).astype(float))
+    return total, w, idx
+
+
+def rank_estimate(logp, key, bins: int = 256, floor: float = -50.0):
+    """(low, estimate, high) number of keys at least as likely as `key` (1 = most likely)."""
+    counts, w, idx = _histograms(logp, bins, floor)
+    at = int(sum(idx[j, k] for j, k in enumerate(key)))
+    m = len(idx)
+    above = lambda b: float(counts[max(b, 0):].sum())
+    return max(1.0, above(at + m)), max(1.0, above(at + 1) + float(counts[at]) / 2), above(at - m)
+
+
+def effort(*logp, bins: int = 256, floor: float = -50.0, quantiles=(0.5, 0.9, 0.99)) -> dict:
+    """
+    Expected number of keys enumerate_keys tries before the right one, and
+    how many it takes to succeed with each probability in `quantiles`.
+    Several tables: the merge_keys of their streams, each table equally likely.
+    """
+    counts = mass = 0
+    for table in logp:
+        c, w, idx = _histograms(table, bins, floor)
+        centres = np.arange(len(c)) * w + len(idx) * floor
+        m = c * np.exp(centres)
+        counts, mass = counts + c, mass + m / m.sum()
+    mass = mass / mass.sum()
+    # best bins first: a key in bin b is tried after everything above it
+    counts, mass = counts[::-1], mass[::-1]
+    before = np.cumsum(counts) - counts
+    out = {"expected": float((mass * (before + (counts + 1) / 2)).sum())}
+    cum = np.cumsum(mass)
+    for q in quantiles:
+        b = min(int(np.searchsorted(cum, q)), len(cum) - 1)
+        out[f"q{round(q * 100)}"] = float(before[b] + counts[b])
+    return out
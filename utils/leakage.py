@@ -0,0 +1,93 @@
+# leakage.py — leakage-model lookup tables and vectorized intermediates.
+#
+#   hw(guess_xor(t))                       # (N, 256) HW(t ^ k) for every guess k      (Alchemist stage one)
+#   hw(guess_xor(t, known=key1))           # (N, 256) HW(t ^ key1 ^ k)                 (Alchemist stage two)
+#   hw(sbox(guess_xor(t)))                 # (N, 256) HW(SBOX[t ^ k])
+#   hd(t[:, None], sbox(guess_xor(t)))     # (N, 256) HD between input and S-box output
+#   bit(sbox(guess_xor(t)), 0)             # (N, 256) LSB of the S-box output (DPA)
+#
+# t is a column of input bytes (N,). Every table is built once, cached and
+# read-only; the functions are plain fancy indexing, so a hypothesis matrix
+# for all guesses costs one gather and no Python loop per trace.
+from __future__ import annotations
+from functools import lru_cache
+
+import numpy as np
+
+
+def _frozen(a: np.ndarray) -> np.ndarray:
+    a.flags.writeable = False
+    return a
+
+
+@lru_cache(maxsize=None)
+def hw_table(bits: int = 8) -> np.ndarray:
+    """(2**bits,) uint8 Hamming weight of every value."""
+    x = np.arange(1 << bits, dtype=np.uint32)
+    out = np.zeros(1 << bits, dtype=np.uint8)
+    for i in range(bits):
+        out += ((x >> i) & 1).astype(np.uint8)
+    return _frozen(out)
+
+
+@lru_cache(maxsize=None)
+def hd_table() -> np.ndarray:
+    """(256, 256) uint8 Hamming distance of every byte pair; for 16 bits use hd()."""
+    x = np.arange(256)
+    return _frozen(hw_table(8)[x[:, None] ^ x])
+
+
+@lru_cache(maxsize=None)
+def bit_table(bits: int = 8) -> np.ndarray:
+    """(2**bits, bits) uint8: bit_table(bits)[x, i] is bit i of x."""
+    x = np.arange(1 << bits, dtype=np.uint32)
+    return _frozen(((x[:, None] >> np.arange(bits)) & 1).astype(np.uint8))
+
+
+@lru_cache(maxsize=None)
+def aes_sbox() -> np.ndarray:
+    """(256,) uint8 AES S-box: GF(2^8) inverse followed by the affine map."""
+    exp, log = [0] * 255, [0] * 256
+    x = 1
+    for i in range(255):
+        exp[i], log[x] = x, i
+        x ^= (x << 1) ^ (0x11b if x & 0x80 else 0)  # x * 3 in GF(2^8)
+    out = np.empty(256, dtype=np.uint8)
+    for v in range(256):
+        b = exp[(255 - log[v]) % 255] if v else 0
+        s = b
+        for r in range(1, 5):
+            s ^= ((b << r) | (b >> (8 - r))) & 0xff
+        out[v] = s ^ 0x63
+    return _frozen(out)
+
+
+HW = hw_table(8)
+HW16 = hw_table(16)
+SBOX = aes_sbox()
+
+
+# ---------------- intermediates ----------------
+def guess_xor(values, known=0, guesses: int = 256) -> np.ndarray:
+    """(N, guesses) values ^ known ^ k for every guess k; `known` is a scalar or (N,) and chains earlier key bytes."""
+    values = np.asarray(values, dtype=np.intp).reshape(-1) ^ np.asarray(known, dtype=np.intp)
+    return values[:, None] ^ np.arange(guesses)
+
+
+def sbox(x, table=SBOX) -> np.ndarray:
+    return table[x]
+
+
+def hw(x, bits: int = 8) -> np.ndarray:
+    return hw_table(bits)[x]
+
+
+def hd(a, b, bits: int = 8) -> np.ndarray:
+    """Hamming distance, broadcasting a against b."""
+    if bits == 8:
+        return hd_table()[a, b]
+    return hw_table(bits)[np.bitwise_xor(a, b)]
+
+
+def bit(x, i: int, bits: int = 8) -> np.ndarray:
+    return bit_table(bits)[x, i]
@@ -0,0 +1,198 @@
+# lease.py — FIFO lease queue for the shared ChipWhisperer.
+#
+# Run the server on the Pi next to rpyc_classic (stdlib only, so the file can
+# be copied there on its own):
+#   python3 lease.py --port 18813
+# remote_cw joins the queue over the same SSH transport when
+# RemoteConfig.lease_port is set, shows its position / ETA, and is woken the
+# moment the holder leaves. The lease lasts as long as the connection, so a
+# crashed script releases it too.
+#
+# Protocol: one JSON object per line.
+#   client -> {"who": "alice@laptop", "job_s": 120}        join (job_s: declared job size, 0 = unknown)
+#   server -> {"pos": 2, "eta_s": 95.0, "holder": "bob"}    pushed on every queue change
+#   server -> {"pos": 0, "granted": true}                   you hold the board (sent once)
+#
+# The ETA is the holder's job_s minus the time it has held the board, plus the
+# job_s of everyone queued in between; nothing else is sent after the hello.
+from __future__ import annotations
+import argparse, json, socket, threading, time
+
+
+class _Entry:
+    def __init__(self, who: str, job_s: float):
+        self.who = who
+        self.job_s = job_s
+        self.granted_at: float | None = None
+
+    def remaining(self, now: float) -> float | None:
+        if not self.job_s:
+            return None
+        return max(0.0, self.job_s - (now - (self.granted_at or now)))
+
+
+class LeaseServer:
+    """
+    Pi-side queue. Also the local stand-in: LeaseServer(port=0).start()
+    runs it in a background thread on 127.0.0.1.
+    """
+    def __init__(self, host: str = "127.0.0.1", port: int = 18813):
+        self._queue: list[_Entry] = []
+        self._cond = threading.Condition()
+        self._version = 0
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind((host, port))
+        self._sock.listen(16)
+        self.port = self._sock.getsockname()[1]
+        self._running = True
+
+    def start(self) -> "LeaseServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def serve_forever(self):
+        while self._running:
+            try:
+                client, _ = self._sock.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._handle, args=(client,), daemon=True).start()
+
+    def stop(self):
+        self._running = False
+        try: self._sock.close()
+        except Exception: pass
+
+    def status(self, entry: _Entry) -> dict:
+        """Queue position and ETA for `entry`; call with the condition held."""
+        now = time.time()
+        pos = self._queue.index(entry)
+        if pos == 0:
+            return {"pos": 0, "granted": True}
+        eta = self._queue[0].remaining(now)
+        for e in self._queue[1:pos]:
+            eta = None if eta is None or not e.job_s else eta + e.job_s
+        return {"pos": pos, "eta_s": eta, "holder": self._queue[0].who}
+
+    # ---- per client ----
+    def _handle(self, client: socket.socket):
+        conn = LineConn(client)
+        entry = None
+        try:
+            hello = conn.recv()
+            if hello is None:
+                return
+            entry = _Entry(str(hello.get("who", "?")), float(hello.get("job_s") or 0))
+            with self._cond:
+                self._queue.append(entry)
+                self._changed()
+            threading.Thread(target=self._wait_close, args=(conn, entry), daemon=True).start()
+            self._push_status(conn, entry)
+        except (OSError, ValueError, AttributeError, TypeError):
+            pass  # gone, or not speaking the protocol (bad JSON, a hello that is not an object): drop it
+        finally:
+            with self._cond:
+                if entry in self._queue:
+                    self._queue.remove(entry)
+                    self._changed()
+            conn.close()
+
+    def _wait_close(self, conn: "LineConn", entry: _Entry):
+        # the lease ends with the connection; anything the client sends meanwhile is ignored
+        try:
+            while conn.recv() is not None:
+                pass
+        except (OSError, ValueError):
+            pass
+        finally:
+            conn.close()  # wakes _push_status with an error on its next send
+            with self._cond:
+                if entry in self._queue:
+                    self._queue.remove(entry)
+                    self._changed()
+
+    def _push_status(self, conn: "LineConn", entry: _Entry):
+        # only what changed for this client: the holder hears "granted" once
+        seen, sent = -1, None
+        while True:
+            with self._cond:
+                while self._version == seen and entry in self._queue:
+                    self._cond.wait()
+                if entry not in self._queue:
+                    return
+                seen = self._version
+                msg = self.status(entry)
+            if msg != sent:
+                conn.send(msg)
+                sent = msg
+
+    def _changed(self):
+        if self._queue and self._queue[0].granted_at is None:
+            self._queue[0].granted_at = time.time()
+        self._version += 1
+        self._cond.notify_all()
+
+
+class LineConn:
+    """JSON lines over anything with sendall/recv/close (socket or paramiko Channel)."""
+    def __init__(self, sock):
+        self._sock = sock
+        self._buf = b""
+
+    def send(self, obj: dict):
+        self._sock.sendall(json.dumps(obj).encode() + b"\n")
+
+    def recv(self) -> dict | None:
+        while b"\n" not in self._buf:
+            chunk = self._sock.recv(4096)
+            if not chunk:
+                return None
+            self._buf += chunk
+        line, self._buf = self._buf.split(b"\n", 1)
+        return json.loads(line)
+
+    def close(self):
+        try: self._sock.close()
+        except Exception: pass
+
+
+class LeaseClient:
+    """
+    lease = LeaseClient(sock, who="alice", job_s=120)
+    lease.acquire(on_update=print)   # blocks until granted, no polling
+    ...
+    lease.release()
+    """
+    def __init__(self, sock, who: str, job_s: float = 0.0):
+        self._conn = LineConn(sock)
+        self.who = who
+        self.job_s = job_s
+
+    def acquire(self, on_update=None) -> None:
+        self._conn.send({"who": self.who, "job_s": self.job_s})
+        while True:
+            msg = self._conn.recv()
+            if msg is None:
+                raise ConnectionError("lease server closed the connection")
+            if on_update:
+                on_update(msg)
+            if msg.get("granted"):
+                return
+
+    def release(self) -> None:
+        self._conn.close()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=18813)
+    args = ap.parse_args()
+    server = LeaseServer(args.host, args.port)
+    print(f"[lease] Serving on {args.host}:{server.port}", flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# multi_cw.py — one campaign, several Pi+CWNANO boards.
+#
+#   boards = [RemoteConfig(host="pi-a", user="pi"), RemoteConfig(host="pi-b", user="pi")]
+#   def setup(cw, scope, target): scope.adc.samples = 2100
+#   data = run_campaign(boards, textin, challenge_name="hyperspaceJumpDrive", setup=setup, command="p")
+#   traces = per_device_normalize(data.traces(), data.device)
+#
+# Every board is opened (remote_cw + setup_cw), flashed with the same image,
+# then pulls chunks of the campaign off a shared queue until it is empty, so a
+# slow or busy board simply takes fewer chunks. A board that fails puts its
+# chunk back for the boards still connected; none is reopened or reflashed.
+# Results come back in input order, each tagged with the board that produced
+# it. The default task is cw.capture_batch; glitch grids or character sweeps
+# pass their own `task`.
+from __future__ import annotations
+import threading
+from dataclasses import dataclass
+
+import numpy as np
+
+from .helper_cv import setup_cw, upload_firmware
+from .remote_cw import remote_cw, RemoteConfig, bcolors
+
+
+@dataclass
+class Dataset:
+    items: list          # the campaign inputs, in order
+    results: list        # task result per item
+    device: np.ndarray   # board tag per item
+
+    def traces(self) -> np.ndarray:
+        """(N, samples) array, for the default capture task."""
+        return np.stack([trace for trace, _ in self.results])
+
+    def responses(self) -> list:
+        return [response for _, response in self.results]
+
+
+def device_tag(cfg: RemoteConfig) -> str:
+    return f"{cfg.host}:{cfg.ssh_port}"
+
+
+def capture_task(**capture_kwargs):
+    """Default task: capture_batch over the chunk, one (trace, response) per item."""
+    def task(cw, scope, target, items):
+        traces, responses = cw.capture_batch(scope, target, items, **capture_kwargs)
+        return list(zip(traces, responses))
+    return task
+
+
+def run_campaign(configs: list[RemoteConfig], items, challenge_name: str | None = None, setup=None,
+                 task=None, chunk: int = 32, **capture_kwargs) -> Dataset:
+    """
+    Shard `items` across the boards in `configs`. task(cw, scope, target,
+    items_chunk) must return one result per item; without it, capture_kwargs
+    go to cw.capture_batch. A board that fails hands its chunk back to the
+    others; the campaign only fails if every board does.
+    """
+    items = list(items)
+    task = task or capture_task(**capture_kwargs)
+    todo = list(range(0, len(items), chunk))
+    busy = [0]  # boards running a chunk right now; only they can hand one back
+    cond = threading.Condition()
+    results: list = [None] * len(items)
+    device = np.empty(len(items), dtype=object)
+    errors: dict[str, BaseException] = {}
+
+    def next_chunk():
+        # an idle board stays connected while others are busy, in case one of them fails
+        with cond:
+            while not todo and busy[0]:
+                cond.wait()
+            if not todo:
+                return None
+            busy[0] += 1
+            return todo.pop(0)
+
+    def work(cfg: RemoteConfig):
+        tag = device_tag(cfg)
+        try:
+            with remote_cw(cfg) as cw:
+                scope, target, prog = setup_cw(cw, cw.scope())
+                if setup:
+                    setup(cw, scope, target)
+                if challenge_name:
+                    upload_firmware(cw, scope, prog, challenge_name)
+                while (start := next_chunk()) is not None:
+                    try:
+                        part = task(cw, scope, target, items[start:start + chunk])
+                    except BaseException:
+                        with cond:
+                            todo.append(start)
+                        raise
+                    finally:
+                        with cond:
+                            busy[0] -= 1
+                            cond.notify_all()
+                    results[start:start + len(part)] = part
+                    device[start:start + len(part)] = tag
+        except BaseException as e:
+            errors[tag] = e
+            print(f"[{bcolors.OKCYAN}multi_cw{bcolors.ENDC}] {bcolors.FAIL}{tag} dropped out: {e}{bcolors.ENDC}", flush=True)
+
+    workers = [threading.Thread(target=work, args=(cfg,), daemon=True) for cfg in configs]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    # boards that are still up take over a failed board's chunks; left over means none was
+    if todo:
+        raise RuntimeError(f"every board failed: {errors}")
+    return Dataset(items, results, device.astype(str))
+
+
+def per_device_normalize(traces: np.ndarray, device: np.ndarray) -> np.ndarray:
+    """Z-score every sample column within each board, so boards with different gain/offset can be pooled."""
+    out = np.empty_like(traces, dtype=float)
+    for tag in np.unique(device):
+        rows = device == tag
+        t = traces[rows]
+        out[rows] = (t - np.nanmean(t, axis=0)) / (np.nanstd(t, axis=0) + 1e-12)
+    return out
@@ -0,0 +1,65 @@
+# pipeline.py — overlap capture and analysis.
+#
+# A capture thread pulls traces off the board in chunks (cw.capture_batch) and
+# feeds a bounded queue; the calling thread consumes each chunk as it lands,
+# so the CPA statistics are current while the next chunk is being captured:
+#
+#   cpa = RunningCPA(byte_model(0))                # utils.cpa
+#   def consume(inputs, traces, done, total):
+#       cpa.update(inputs, traces)
+#       print(f"[{done}/{total}] best guesses: {cpa.ranks()[:3]}")
+#   traces = capture_pipeline(cw, scope, target, textin, consume, command="p")
+#
+# consume returning True stops the capture early (see cpa.EarlyStop).
+from __future__ import annotations
+import queue, threading
+import numpy as np
+
+
+def capture_pipeline(cw, scope, target, inputs, consume, chunk: int = 32, maxsize: int = 4, **capture_kwargs):
+    """
+    Capture every entry of `inputs` and call consume(inputs_chunk, traces_chunk,
+    done, total) for each chunk in capture order; a True return stops there.
+    At most `maxsize` chunks wait in the queue; the capture thread blocks
+    beyond that. Returns the traces captured so far as one (n, samples) array
+    (NaN rows for timed-out captures), n == len(inputs) unless stopped.
+    """
+    inputs = [bytes(x) for x in inputs]
+    q: queue.Queue = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+    failure: list[BaseException] = []
+
+    def produce():
+        try:
+            for i in range(0, len(inputs), chunk):
+                if stop.is_set():
+                    return
+                part = inputs[i:i + chunk]
+                traces, _ = cw.capture_batch(scope, target, part, **capture_kwargs)
+                q.put((part, traces))
+        except BaseException as e:
+            failure.append(e)
+        finally:
+            q.put(None)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    out = []
+    done = 0
+    try:
+        while (item := q.get()) is not None:
+            part, traces = item
+            out.append(traces)
+            done += len(part)
+            if consume(part, traces, done, len(inputs)):
+                break
+    finally:
+        stop.set()
+        # unblock a producer waiting on a full queue, then let it finish its chunk
+        while producer.is_alive():
+            try: q.get(timeout=0.1)
+            except queue.Empty: pass
+    if failure:
+        raise failure[0]
+    return np.concatenate(out) if out else np.empty((0, 0))
+
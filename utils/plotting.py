@@ -0,0 +1,233 @@
+# plotting.py — draw figures in worker processes, off the capture loop.
+#
+#   with Plotter() as plots:
+#       plots.traces("traces/sort_3.png", np.stack([reference, trace]))
+#       plots.overlay("figures/overlay_pos3.png", reference, final, title="...")
+#       plots.heatmap("figures/cpa_kbyte_0.png", corr, mark_row=best, title="...")
+#       plots.bar("figures/maxcorr_kbyte_0.png", maxcpa, title="...")
+#   # leaving the block waits for the pending figures
+#
+# Arrays go to the workers through multiprocessing.shared_memory (one copy,
+# no pickling); the workers downsample before drawing (min/max envelope for
+# line plots, max-pooling for heatmaps, or LTTB with downsample="lttb") and
+# import Matplotlib themselves, so the capturing process never does.
+from __future__ import annotations
+import multiprocessing, os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .remote_cw import bcolors
+
+# the rcParams the solve scripts set for their report figures
+FIG_STYLE = {
+    "font.size": 14,
+    "axes.titlesize": 18,
+    "axes.labelsize": 16,
+    "xtick.labelsize": 14,
+    "ytick.labelsize": 14,
+    "legend.fontsize": 14,
+}
+
+
+# ---------------- downsampling ----------------
+def minmax_downsample(y, points: int):
+    """(x, y) keeping each bucket's min and max, in order: the envelope survives, ~`points` long."""
+    y = np.asarray(y)
+    n = len(y)
+    if n <= points:
+        return np.arange(n), y.copy()
+    buckets = max(1, points // 2)
+    edges = np.linspace(0, n, buckets + 1).astype(int)
+    lo = np.minimum.reduceat(y, edges[:-1])
+    hi = np.maximum.reduceat(y, edges[:-1])
+    i_lo = np.array([s + np.argmin(y[s:e]) for s, e in zip(edges[:-1], edges[1:])])
+    i_hi = np.array([s + np.argmax(y[s:e]) for s, e in zip(edges[:-1], edges[1:])])
+    first = i_lo <= i_hi
+    x = np.where(first[:, None], np.c_[i_lo, i_hi], np.c_[i_hi, i_lo]).reshape(-1)
+    v = np.where(first[:, None], np.c_[lo, hi], np.c_[hi, lo]).reshape(-1)
+    return x, v
+
+
+def lttb_downsample(y, points: int):
+    """(x, y) by Largest-Triangle-Three-Buckets: keeps the visual shape with `points` samples."""
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= points or points < 3:
+        return np.arange(n), y.copy()
+    edges = np.linspace(1, n - 1, points - 1).astype(int)
+    idx = np.empty(points, dtype=int)
+    idx[0], idx[-1] = 0, n - 1
+    a = 0
+    for b in range(points - 2):
+        s, e = edges[b], edges[b + 1]
+        nxt = slice(edges[b + 1], edges[b + 2] if b + 2 < len(edges) else n)
+        cx, cy = (nxt.start + nxt.stop - 1) / 2, y[nxt].mean()
+        xs = np.arange(s, e)
+        area = np.abs((a - cx) * (y[s:e] - y[a]) - (a - xs) * (cy - y[a]))
+        a = s + int(np.argmax(area))
+        idx[b + 1] = a
+    return idx, y[idx]
+
+
+def pool_columns(m, columns: int):
+    """Max-pool a 2-D array down to ~`columns` columns, keeping peaks visible."""
+    m = np.asarray(m)
+    if m.shape[1] <= columns:
+        return m.copy()
+    edges = np.linspace(0, m.shape[1], columns + 1).astype(int)[:-1]
+    return np.maximum.reduceat(m, edges, axis=1)
+
+
+_DOWNSAMPLE = {"minmax": minmax_downsample, "lttb": lttb_downsample}
+
+
+# ---------------- drawing (runs in the workers) ----------------
+def _pyplot(style):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    plt.rcParams.update(style or {})
+    return plt
+
+
+def draw_traces(filename, traces, *, points=4000, downsample="minmax", style=None, dpi=300,
+                title="Confronto tra due tracce di acquisizione"):
+    plt = _pyplot(style)
+    fig = plt.figure(figsize=(50, 4))
+    ax = fig.add_subplot(111)
+    for i, trace in enumerate(traces):
+        x, y = _DOWNSAMPLE[downsample](trace, points)
+        ax.plot(x, y, label=f"Trace {i + 1}", linewidth=1.5, alpha=1.0 if i == 0 else 0.6)
+    ax.set_title(title, pad=12)
+    ax.legend(loc="upper right", fontsize=10)
+    ax.set_xlabel("Campioni")
+    ax.set_ylabel("Ampiezza del segnale")
+    ax.grid(True, linestyle="--", alpha=0.4)
+    fig.tight_layout()
+    fig.savefig(filename, dpi=dpi)
+    plt.close(fig)
+
+
+def draw_overlay(filename, reference, candidate, *, label="candidate", title="", start=0, points=4000,
+                 downsample="minmax", style=None, dpi=200):
+    plt = _pyplot(style)
+    fig, (ax1, ax2) = plt.subplots(2, 1, sharex=True, figsize=(10, 4), gridspec_kw={'height_ratios': [3, 1]})
+    for y, kw in ((reference, dict(label='reference')), (candidate, dict(alpha=0.9, label=label))):
+        x, v = _DOWNSAMPLE[downsample](y, points)
+        ax1.plot(start + x, v, linewidth=1, **kw)
+    ax1.set_ylabel('ADC')
+    ax1.legend(loc='upper right')
+    ax1.set_title(title)
+    x, v = _DOWNSAMPLE[downsample](np.asarray(candidate) - np.asarray(reference), points)
+    ax2.plot(start + x, v, linewidth=1)
+    ax2.set_ylabel('difference')
+    ax2.set_xlabel('sample index')
+    ax2.axhline(0, color='k', linewidth=0.5, alpha=0.5)
+    fig.tight_layout()
+    fig.savefig(filename, dpi=dpi)
+    plt.close(fig)
+
+
+def draw_heatmap(filename, matrix, *, mark_row=None, title="", xlabel='Sample index', ylabel='Key guess (0..255)',
+                 clabel='|correlation|', columns=2000, style=None, dpi=200):
+    plt = _pyplot(style)
+    fig = plt.figure(figsize=(10, 5))
+    m = pool_columns(matrix, columns)
+    plt.imshow(m, aspect='auto', origin='lower', interpolation='nearest',
+               extent=(0, np.shape(matrix)[1], -0.5, len(m) - 0.5))
+    plt.colorbar(label=clabel)
+    plt.xlabel(xlabel)
+    plt.ylabel(ylabel)
+    plt.title(title)
+    if mark_row is not None:
+        plt.axhline(mark_row, color='white', linewidth=1.0, linestyle='--', alpha=0.8)
+    plt.tight_layout()
+    fig.savefig(filename, dpi=dpi)
+    plt.close(fig)
+
+
+def draw_bar(filename, values, *, title="", xlabel='Key guess', ylabel='max |corr|', style=None, dpi=200):
+    plt = _pyplot(style)
+    fig = plt.figure(figsize=(10, 2.5))
+    plt.bar(np.arange(len(values)), values)
+    plt.xlabel(xlabel)
+    plt.ylabel(ylabel)
+    plt.title(title)
+    plt.tight_layout()
+    fig.savefig(filename, dpi=dpi)
+    plt.close(fig)
+
+
+def _render(draw, filename, specs, kwargs):
+    # attach to the parent's shared memory; draw_* only keep downsampled copies
+    blocks = [shared_memory.SharedMemory(name=name) for name, _, _ in specs]
+    try:
+        arrays = [np.ndarray(shape, dtype=dtype, buffer=b.buf) for b, (_, shape, dtype) in zip(blocks, specs)]
+        draw(filename, *arrays, **kwargs)
+        del arrays
+        return filename
+    finally:
+        for b in blocks:
+            b.close()
+
+
+# ---------------- service ----------------
+class Plotter:
+    def __init__(self, workers: int = 2, style: dict | None = None):
+        """`style`: rcParams for every figure (FIG_STYLE for the report look)."""
+        # spawn, not fork: the caller usually has SSH/RPyC threads running
+        self._pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        self.style = style
+        self._pending = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def submit(self, draw, filename: str, *arrays, **kwargs):
+        """Run draw(filename, *arrays, **kwargs) in a worker; returns its Future."""
+        os.makedirs(os.path.dirname(str(filename)) or ".", exist_ok=True)
+        blocks, specs = [], []
+        for a in arrays:
+            a = np.ascontiguousarray(a)
+            b = shared_memory.SharedMemory(create=True, size=max(1, a.nbytes))
+            np.ndarray(a.shape, dtype=a.dtype, buffer=b.buf)[...] = a
+            blocks.append(b)
+            specs.append((b.name, a.shape, a.dtype.str))
+        kwargs.setdefault("style", self.style)
+        fut = self._pool.submit(_render, draw, str(filename), specs, kwargs)
+        self._pending.add(fut)
+
+        def done(f):
+            for b in blocks:
+                b.close()
+                b.unlink()
+            self._pending.discard(f)
+            if f.exception() is not None:
+                print(f"{bcolors.WARNING}[plot]{bcolors.ENDC} {filename}: {f.exception()}")
+        fut.add_done_callback(done)
+        return fut
+
+    def traces(self, filename, traces, **kw):
+        return self.submit(draw_traces, filename, np.asarray(traces), **kw)
+
+    def overlay(self, filename, reference, candidate, **kw):
+        return self.submit(draw_overlay, filename, reference, candidate, **kw)
+
+    def heatmap(self, filename, matrix, **kw):
+        return self.submit(draw_heatmap, filename, matrix, **kw)
+
+    def bar(self, filename, values, **kw):
+        return self.submit(draw_bar, filename, values, **kw)
+
+    def wait(self) -> None:
+        for f in list(self._pending):
+            f.exception()
+
+    def close(self) -> None:
+        self.wait()
+        self._pool.shutdown(wait=True)
@@ -1,9 +1,13 @@
-# remote_cw.py — tunnel-only, adds put_file(); waits indefinitely with live timer if busy
+# remote_cw.py — SSH-tunnelled rpyc (direct channel or local forward), adds put_file(); waits indefinitely with live timer if busy
 from __future__ import annotations
-import os, posixpath
-import socket, select, threading, time
+import hashlib, os, posixpath
+import socket, selectors, threading, time, weakref
 from dataclasses import dataclass
 import paramiko, rpyc
+from rpyc.core.stream import SocketStream
+from rpyc.utils.classic import obtain
+
+from . import remote_ops
 
 class bcolors:
     HEADER = '\033[95m'
@@ -27,6 +31,12 @@ class RemoteConfig:
     port: int = 18812                # remote rpyc port (and local forwarded port)
     connect_host: str = "127.0.0.1"  # local endpoint we connect to
     remote_host: str = "127.0.0.1"   # remote endpoint rpyc server is bound to
+    local_port: int | None = None    # local forwarded port (defaults to `port`)
+    transport: str = "channel"       # "channel": rpyc straight over the SSH channel, "forward": local port forward, "sim": utils.sim_cw
+    broker: str | None = None        # unix socket of a running utils.broker; attach to it instead if present
+    lease_port: int | None = None    # port of utils/lease.py on the Pi; queue for the board instead of polling
+    job_s: float = 0.0               # declared job size, shown to whoever queues behind us
+    instrument: bool = False         # count RPyC requests / bytes / time per helper (cw.rpc_stats), table on exit
 
     # Behavior
     connect_timeout_s: float = 8.0     # (kept for tunnel setup errs)
@@ -39,26 +49,78 @@ class remote_cw:
         self._ssh: paramiko.SSHClient | None = None
         self._conn: rpyc.Connection | None = None
         self._tunnel: _Forwarder | None = None
+        self._broker = None
+        self._lease = None
+        self._stats = None
 
     # ---------------- context manager ----------------
     def __enter__(self):
+        if self.cfg.transport == "sim":
+            from .sim_cw import SimCW
+            return SimCW(verbose=self.cfg.verbose)
+
+        if self.cfg.broker and os.path.exists(self.cfg.broker):
+            broker = self._attach_broker()
+            if broker is not None:
+                return broker
+
         self._ssh_connect()
-        self._open_tunnel(local_port=self.cfg.port, remote_port=self.cfg.port)
+        if self.cfg.transport == "forward":
+            self._open_tunnel(local_port=self.cfg.local_port or self.cfg.port, remote_port=self.cfg.port)
+        elif self.cfg.transport != "channel":
+            raise ValueError(f"Unknown transport: {self.cfg.transport!r}")
+
+        if self.cfg.lease_port:
+            self._acquire_lease()
 
         # Connect (wait forever if another peer is using it)
         self._connect_wait_forever()
+        if self.cfg.instrument:
+            self._instrument(self._conn)
 
-        # Build a proxy that behaves like the cw module but adds put_file()
+        # Build a proxy that behaves like the cw module but adds put_file()/capture_batch()
         cw_module = self._conn.modules["chipwhisperer"]
-        return _CWProxy(cw_module, self._ssh, verbose=self.cfg.verbose)
+        return _CWProxy(cw_module, self._ssh, self._conn, verbose=self.cfg.verbose, rpc_stats=self._stats)
+
+    def _attach_broker(self):
+        from .broker import attach
+        try:
+            self._broker = attach(self.cfg.broker, verbose=self.cfg.verbose)
+        except (OSError, EOFError) as e:
+            # a broker that died leaves its socket behind; nobody is listening on it
+            if isinstance(e, ConnectionRefusedError):
+                try:
+                    os.unlink(self.cfg.broker)
+                except OSError:
+                    pass
+            if self.cfg.verbose:
+                print(f"[{bcolors.OKCYAN}remote_cw{bcolors.ENDC}] {bcolors.WARNING}Broker {self.cfg.broker} not answering ({e!r}); connecting directly.{bcolors.ENDC}", flush=True)
+            return None
+        if self.cfg.instrument:
+            self._broker.rpc_stats = self._instrument(self._broker._conn)
+        return self._broker
 
     def __exit__(self, exc_type, exc, tb):
+        if self._stats:
+            print(f"[{bcolors.OKCYAN}remote_cw{bcolors.ENDC}] RPyC usage this session:", flush=True)
+            print(self._stats.table(), flush=True)
+            self._stats = None
+
+        if self._broker:
+            self._broker.close()
+            self._broker = None
+            return
+
         try:
             if self._conn:
                 self._conn.close()
         finally:
             self._conn = None
 
+        if self._lease:
+            self._lease.release()
+            self._lease = None
+
         try:
             self._close_tunnel()
         finally:
@@ -81,9 +143,23 @@ class remote_cw:
             timeout=15,
         )
         self._ssh = cli
+        # paramiko leaves Nagle on; small RPyC frames should not wait for ACKs (see _disable_nagle)
+        cli.get_transport().sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
         if self.cfg.verbose:
             print(f"[{bcolors.OKCYAN}remote_cw{bcolors.ENDC}] SSH to {self.cfg.user}@{self.cfg.host} ok", flush=True)
 
+    def _rpyc_connect(self) -> rpyc.Connection:
+        if self.cfg.transport == "channel":
+            # No loopback hop: RPyC reads/writes the direct-tcpip channel itself.
+            transport = self._ssh.get_transport()
+            if not transport:
+                raise RuntimeError("SSH transport not available")
+            transport.set_keepalive(30)
+            chan = transport.open_channel("direct-tcpip", (self.cfg.remote_host, self.cfg.port), ("127.0.0.1", 0),
+                                          timeout=self.cfg.connect_timeout_s)
+            return rpyc.classic.connect_stream(SocketStream(chan))
+        return rpyc.classic.connect(self.cfg.connect_host, port=self.cfg.local_port or self.cfg.port, keepalive=True)
+
     def _open_tunnel(self, local_port: int, remote_port: int):
         transport = self._ssh.get_transport()
         if not transport:
@@ -102,6 +178,39 @@ class remote_cw:
             self._tunnel.stop()
             self._tunnel = None
 
+    def _instrument(self, conn):
+        from .instrument import instrument
+        self._stats = instrument(conn)
+        return self._stats
+
+    # ---- FIFO lease (utils/lease.py on the Pi) ----
+    def _acquire_lease(self):
+        from .lease import LeaseClient
+        transport = self._ssh.get_transport()
+        transport.set_keepalive(15)  # keep the transport warm while queued
+        chan = transport.open_channel("direct-tcpip", (self.cfg.remote_host, self.cfg.lease_port), ("127.0.0.1", 0),
+                                      timeout=self.cfg.connect_timeout_s)
+        who = f"{os.environ.get('USER', '?')}@{socket.gethostname()}"
+        self._lease = LeaseClient(chan, who=who, job_s=self.cfg.job_s)
+        start = time.time()
+        queued = False
+
+        def show(msg):
+            nonlocal queued
+            if msg.get("granted"):
+                if queued:
+                    print()
+                    print(f"[{bcolors.OKCYAN}remote_cw{bcolors.ENDC}] {bcolors.OKGREEN}Lease granted after {int(time.time() - start)}s.{bcolors.ENDC}", flush=True)
+                return
+            if not queued:
+                print(f"[{bcolors.OKCYAN}remote_cw{bcolors.ENDC}] {bcolors.WARNING}Board held by {msg.get('holder')} — queued.{bcolors.ENDC}", flush=True)
+                queued = True
+            eta = msg.get("eta_s")
+            eta = f"~{int(eta)}s" if eta is not None else "unknown"
+            print(f"\r{bcolors.OKBLUE}[queued]{bcolors.ENDC} position {msg['pos']}, ETA {eta} (holder: {msg.get('holder')})   ", end="", flush=True)
+
+        self._lease.acquire(on_update=show)
+
     # ---- connect + busy-wait with pretty timer ----
     def _connect_wait_forever(self):
         spinner = ['⠋','⠙','⠹','⠸','⠼','⠴','⠦','⠧','⠇','⠏']
@@ -112,10 +221,11 @@ class remote_cw:
         while True:
             try:
                 if self.cfg.verbose:
-                    print(f"[{bcolors.OKCYAN}remote_cw{bcolors.ENDC}] Connecting to {self.cfg.connect_host}:{self.cfg.port} …", flush=True)
-                self._conn = rpyc.classic.connect(self.cfg.connect_host, port=self.cfg.port, keepalive=True)
+                    print(f"[{bcolors.OKCYAN}remote_cw{bcolors.ENDC}] Connecting to {self.cfg.remote_host}:{self.cfg.port} ({self.cfg.transport}) …", flush=True)
+                self._conn = self._rpyc_connect()
                 # sanity ping
                 self._conn.execute("42")
+                _disable_nagle(self._conn)
                 if warned:
                     # clear the live line
                     print()
@@ -159,44 +269,104 @@ class _CWProxy:
     """
     Thin proxy around the remote 'chipwhisperer' module that also exposes:
       - put_file(local_path, remote_name=None, mode=0o644) -> str
+      - program_target(scope, prog, fw_path, force=False)
+      - capture_batch(scope, target, inputs, ...) -> (traces, responses)
     Files are uploaded to /remote_files by default; if that's not writable,
-    we fall back to $HOME/remote_files.
+    we fall back to $HOME/remote_files. Uploads and flashes are skipped when
+    the Pi / target already has the same bytes (sha256); the flash marker
+    goes stale if the board is flashed outside this proxy (use force=True).
     """
-    def __init__(self, cw_module, ssh: paramiko.SSHClient, verbose: bool = True):
+    def __init__(self, cw_module, ssh: paramiko.SSHClient, conn: rpyc.Connection, verbose: bool = True,
+                 rpc_stats=None):
         self._cw = cw_module
+        self.rpc_stats = rpc_stats  # utils.instrument.RpcStats when RemoteConfig.instrument is set
         self._ssh = ssh
+        self._conn = conn
         self._verbose = verbose
+        self._ops = None
+        self._sftp: paramiko.SFTPClient | None = None
+        self._remote_dir: str | None = None
+        self._digests: dict[str, str] = {}  # remote path -> sha256 of what we put there
+
+    def capture_batch(self, scope, target, inputs, command: str = "a", read_bytes: int = 18,
+                      reset: bool = True, platform: str = "CWNANO"):
+        """
+        Run the cap_pass_trace loop for every input on the Pi and pull the
+        result back in one go. Returns (traces, responses) where traces is a
+        (N, samples) numpy array; timed-out captures are NaN rows / None.
+        """
+        inputs = tuple(bytes(x) for x in inputs)  # tuples of bytes travel by value
+        traces, responses = self._remote_ops().capture_batch(
+            scope, target, inputs, command=command, read_bytes=read_bytes,
+            reset=reset, platform=platform,
+        )
+        return obtain(traces), obtain(responses)
 
     def put_file(self, local_path: str, remote_name: str | None = None, mode: int = 0o644) -> str:
-        import os, posixpath
         if not os.path.isfile(local_path):
             raise FileNotFoundError(f"Local file not found: {local_path}")
         local_path = os.path.abspath(local_path)
         base = remote_name if remote_name else os.path.basename(local_path)
 
-        # choose /remote_files or fallback to $HOME/remote_files
+        # choose /remote_files or fallback to $HOME/remote_files (resolved once per session)
         remote_dir = self._resolve_remote_files_dir()
-
-        # ensure directory exists (mkdir -p)
-        self._mkdir_p_remote(remote_dir)
-
         remote_path = posixpath.join(remote_dir, base)
 
-        sftp = self._ssh.open_sftp()
-        try:
+        # content-addressed: skip the upload when the Pi already has these bytes
+        digest = _sha256_file(local_path)
+        if self._remote_digest(remote_path) == digest:
+            if self._verbose:
+                print(f"[{bcolors.OKCYAN}remote_cw{bcolors.ENDC}] {remote_path} up to date, not uploading", flush=True)
+        else:
+            sftp = self._sftp_session()
             if self._verbose:
                 print(f"[{bcolors.OKCYAN}remote_cw{bcolors.ENDC}] Uploading {local_path} → {remote_path}", flush=True)
             sftp.put(local_path, remote_path)
             sftp.chmod(remote_path, mode)
-        finally:
-            sftp.close()
+        self._digests[remote_path] = digest
         return remote_path
 
+    def program_target(self, scope, prog, fw_path: str, *args, force: bool = False, **kwargs):
+        """
+        cw.program_target, skipped when the scope's target was last flashed
+        with the same image (by sha256). The last flashed digest is kept on
+        the Pi, per scope serial, so it survives across sessions.
+
+        The marker only knows about flashes made through this proxy: if
+        anything else (ChipWhisperer GUI, another script, a plain cw on the
+        Pi) reprograms the board, the marker is stale and the flash would be
+        wrongly skipped. Pass force=True then, and also when the reflash is
+        meant to reset the target's state rather than change its image.
+        """
+        digest = self._digests.get(fw_path) or self._remote_digest(fw_path)
+        marker = self._flash_marker(scope)
+        if not force and digest and self._read_remote(marker) == digest:
+            if self._verbose:
+                print(f"[{bcolors.OKCYAN}remote_cw{bcolors.ENDC}] Target already runs {posixpath.basename(fw_path)}, not reprogramming", flush=True)
+            return None
+        # drop the marker first: a failed flash leaves the image unknown
+        self._write_remote(marker, None)
+        ret = self._cw.program_target(scope, prog, fw_path, *args, **kwargs)
+        if digest:
+            self._write_remote(marker, digest)
+        return ret
+
     # -------- helpers --------
+    def _remote_ops(self):
+        if self._ops is None:
+            self._ops = install_remote_ops(self._conn)
+        return self._ops
+
     def _resolve_remote_files_dir(self) -> str:
         """
         Try /remote_files; if not creatable/writable, fallback to $HOME/remote_files.
+        The answer is memoized for the session.
         """
+        if self._remote_dir is None:
+            self._remote_dir = self._probe_remote_files_dir()
+        return self._remote_dir
+
+    def _probe_remote_files_dir(self) -> str:
         if self._try_mkdir("/remote_files"):
             return "/remote_files"
         home = self._remote_home() or "/tmp"
@@ -211,6 +381,39 @@ class _CWProxy:
             print(f"[{bcolors.OKCYAN}remote_cw{bcolors.ENDC}] Falling back to {tmpdir} (no permission for $HOME).", flush=True)
         return tmpdir
 
+    def _sftp_session(self) -> paramiko.SFTPClient:
+        if self._sftp is None:
+            self._sftp = self._ssh.open_sftp()
+        return self._sftp
+
+    def _remote_digest(self, path: str) -> str | None:
+        _, stdout, _ = self._ssh.exec_command(f"sha256sum -- {sh_quote(path)} 2>/dev/null")
+        out = stdout.read().decode().split()
+        return out[0] if out else None
+
+    def _flash_marker(self, scope) -> str:
+        try:
+            sn = str(scope.sn)
+        except Exception:
+            sn = "default"
+        return posixpath.join(self._resolve_remote_files_dir(), f".last_flashed-{sn}")
+
+    def _read_remote(self, path: str) -> str | None:
+        try:
+            with self._sftp_session().open(path, "r") as f:
+                return f.read().decode().strip()
+        except IOError:
+            return None
+
+    def _write_remote(self, path: str, text: str | None) -> None:
+        sftp = self._sftp_session()
+        if text is None:
+            try: sftp.remove(path)
+            except IOError: pass
+            return
+        with sftp.open(path, "w") as f:
+            f.write(text)
+
     def _remote_home(self) -> str | None:
         cmd = "bash -lc 'printf %s \"$HOME\"'"
         _, stdout, _ = self._ssh.exec_command(cmd)
@@ -232,37 +435,92 @@ class _CWProxy:
     def __getattr__(self, name):
         return getattr(self._cw, name)
 
+_installed_ops: "weakref.WeakKeyDictionary[rpyc.Connection, object]" = weakref.WeakKeyDictionary()
+
+def install_remote_ops(conn: rpyc.Connection):
+    """Install utils/remote_ops.py as a module on the RPyC server (once per connection)."""
+    mod = _installed_ops.get(conn)
+    if mod is None:
+        import inspect
+        mod = conn.modules.types.ModuleType("remote_ops")
+        conn.builtins.exec(inspect.getsource(remote_ops), mod.__dict__)
+        _installed_ops[conn] = mod
+    return mod
+
+def remote_ops_for(obj):
+    """remote_ops next to `obj`: the Pi's copy for a netref (scope/target), the local module otherwise."""
+    if not isinstance(obj, rpyc.BaseNetref):
+        return remote_ops
+    conn = object.__getattribute__(obj, "____conn__")
+    if hasattr(conn, "modules"):
+        return install_remote_ops(conn)
+    # attached to a broker (not a classic connection): the copy it installed on its own
+    mod = _installed_ops.get(conn)
+    if mod is None:
+        mod = _installed_ops[conn] = conn.root.remote_ops()
+    return mod
+
+def _sha256_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _disable_nagle(conn: rpyc.Connection):
+    """
+    Neither rpyc_classic nor rpyc.classic.connect set TCP_NODELAY, so a
+    request or reply queued behind an unacknowledged one (e.g. right after
+    the async release of a dropped netref) waits for the delayed ACK, ~40 ms
+    per call. Switch Nagle off on both ends of the RPyC socket.
+    """
+    for stream in (lambda: conn._channel.stream, lambda: conn.root._conn._channel.stream):
+        try:
+            stream().sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except Exception:
+            pass  # a paramiko channel or a unix socket: no Nagle to turn off
+
 def sh_quote(s: str) -> str:
     return "'" + s.replace("'", "'\"'\"'") + "'"
 
 class _Forwarder(threading.Thread):
-    """Local port forwarder over an existing Paramiko Transport (ssh -L)."""
+    """
+    Local port forwarder over an existing Paramiko Transport (ssh -L).
+    A single selector loop serves the listener and every forwarded
+    socket/channel pair; no per-connection threads.
+    """
+    BUFSIZE = 256 * 1024
+
     def __init__(self, transport: paramiko.Transport, local_addr, remote_addr):
         super().__init__(daemon=True)
         self.transport = transport
         self.local_addr = local_addr
         self.remote_addr = remote_addr
         self._running = True
+        self._peer = {}  # client socket <-> channel, both directions
+        self._sel = selectors.DefaultSelector()
         self._listen_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self._listen_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self._listen_sock.bind(self.local_addr)
         self._listen_sock.listen(5)
 
     def run(self):
+        self._sel.register(self._listen_sock, selectors.EVENT_READ)
         try:
             while self._running:
-                r, _, _ = select.select([self._listen_sock], [], [], 1)
-                if self._listen_sock in r:
-                    client, addr = self._listen_sock.accept()
-                    try:
-                        chan = self.transport.open_channel("direct-tcpip", self.remote_addr, addr)
-                    except Exception:
-                        client.close()
-                        continue
-                    threading.Thread(target=self._pump, args=(client, chan), daemon=True).start()
+                for key, _ in self._sel.select(timeout=1):
+                    if not self._running:
+                        break
+                    if key.fileobj is self._listen_sock:
+                        self._accept()
+                    else:
+                        self._forward(key.fileobj)
         finally:
+            for s in list(self._peer):
+                self._drop(s)
             try: self._listen_sock.close()
             except Exception: pass
+            self._sel.close()
 
     def stop(self):
         self._running = False
@@ -271,21 +529,41 @@ class _Forwarder(threading.Thread):
         except Exception:
             pass
 
-    @staticmethod
-    def _pump(client, chan):
+    def _accept(self):
+        client, addr = self._listen_sock.accept()
+        client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        client.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.BUFSIZE)
+        client.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.BUFSIZE)
         try:
-            while True:
-                r, _, _ = select.select([client, chan], [], [])
-                if client in r:
-                    buf = client.recv(16384)
-                    if not buf: break
-                    chan.sendall(buf)
-                if chan in r:
-                    buf = chan.recv(16384)
-                    if not buf: break
-                    client.sendall(buf)
-        finally:
-            try: client.close()
-            finally:
-                try: chan.close()
-                except Exception: pass
+            chan = self.transport.open_channel("direct-tcpip", self.remote_addr, addr)
+        except Exception:
+            client.close()
+            return
+        self._peer[client] = chan
+        self._peer[chan] = client
+        self._sel.register(client, selectors.EVENT_READ)
+        self._sel.register(chan, selectors.EVENT_READ)
+
+    def _forward(self, src):
+        dst = self._peer.get(src)
+        if dst is None:
+            return
+        try:
+            buf = src.recv(self.BUFSIZE)
+            if buf:
+                dst.sendall(buf)
+        except (OSError, EOFError):
+            buf = b""
+        if not buf:
+            self._drop(src)
+
+    def _drop(self, s):
+        other = self._peer.pop(s, None)
+        self._peer.pop(other, None)
+        for x in (s, other):
+            if x is None:
+                continue
+            try: self._sel.unregister(x)
+            except Exception: pass
+            try: x.close()
+            except Exception: pass
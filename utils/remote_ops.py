@@ -0,0 +1,286 @@
+# remote_ops.py — capture loops that run next to the scope (on the Pi).
+# remote_cw ships this file's source to the RPyC server once per connection
+# (see _CWProxy._remote_ops), so keep it self-contained: stdlib + numpy only,
+# no imports from utils.
+import pickle, re, time
+import numpy as np
+
+
+def reset_target(scope, platform: str = "CWNANO"):
+    if getattr(scope, "simulated", False):  # utils.sim_cw: no board to wait for
+        return
+    if platform == "CW303" or platform == "CWLITEXMEGA":
+        scope.io.pdic = 'low'
+        time.sleep(0.1)
+        scope.io.pdic = 'high_z' #XMEGA doesn't like pdic driven high
+        time.sleep(0.1) #xmega needs more startup time
+    elif "neorv32" in platform.lower():
+        raise IOError("Default iCE40 neorv32 build does not have external reset - reprogram device to reset")
+    elif platform == "CW308_SAM4S" or platform == "CWHUSKY":
+        scope.io.nrst = 'low'
+        time.sleep(0.25)
+        scope.io.nrst = 'high_z'
+        time.sleep(0.25)
+    else:
+        scope.io.nrst = 'low'
+        time.sleep(0.05)
+        scope.io.nrst = 'high_z'
+        time.sleep(0.05)
+
+
+def scope_settings(scope):
+    """The scope parameters a trace depends on, as ((name, value), ...): plain tuples travel by value."""
+    return (
+        ("samples", int(scope.adc.samples)),
+        ("clk_freq", float(scope.adc.clk_freq)),
+        ("clkout", float(scope.io.clkout)),
+    )
+
+
+def _setting_owner(scope, target, path: str):
+    # "target.baud" lives on the target, everything else ("adc.samples", "io.clkout") on the scope
+    parts = path.split(".")
+    obj = target if parts[0] == "target" else scope
+    for name in parts[1 if parts[0] == "target" else 0:-1]:
+        obj = getattr(obj, name)
+    return obj, parts[-1]
+
+
+def read_settings(scope, target, paths):
+    """((path, value), ...) for dotted setting paths, in one round trip."""
+    out = []
+    for path in paths:
+        obj, name = _setting_owner(scope, target, path)
+        out.append((path, getattr(obj, name)))
+    return tuple(out)
+
+
+def _same(old, value) -> bool:
+    # floats compare with 0.1% slack because the hardware rounds clocks
+    if isinstance(value, float) and isinstance(old, (int, float)):
+        return abs(old - value) <= 1e-3 * abs(value)
+    return old == value
+
+
+def _matches(scope, target, settings) -> bool:
+    for path, value in settings:
+        obj, name = _setting_owner(scope, target, path)
+        if not _same(getattr(obj, name), value):
+            return False
+    return True
+
+
+def apply_settings(scope, target, wanted, baud_per_hz=None, default_setup: bool = False, base=()):
+    """
+    Write only the settings in `wanted` ((path, value), ...) that differ from
+    the current state, in order. baud_per_hz: afterwards set target.baud to
+    baud_per_hz * the io.clkout actually in effect. default_setup: call
+    scope.default_setup() first, unless the scope already matches `base`
+    (the fields default_setup() writes) or `wanted`, i.e. it is still in its
+    default state or was left configured like this. Returns ((path, old, new), ...).
+    """
+    wanted = tuple(wanted)
+    if default_setup and not ((base and _matches(scope, target, base)) or _matches(scope, target, wanted)):
+        time.sleep(0.05)
+        scope.default_setup()
+    if baud_per_hz is not None:
+        wanted = wanted + (("target.baud", None),)
+    changed = []
+    for path, value in wanted:
+        obj, name = _setting_owner(scope, target, path)
+        if value is None and path == "target.baud":
+            value = baud_per_hz * float(scope.io.clkout)
+        old = getattr(obj, name)
+        if not _same(old, value):
+            setattr(obj, name, value)
+            changed.append((path, old, getattr(obj, name)))
+    return tuple(changed)
+
+
+def drain(target):
+    # wait two character times for stragglers, not a fixed 10 ms
+    quiet = 20 / _baud(target)
+    num_char = target.in_waiting()
+    while num_char > 0:
+        target.read(num_char, 10)
+        time.sleep(quiet)
+        num_char = target.in_waiting()
+
+
+def serial_timeout_ms(target, read_bytes: int, compute_ms: float) -> int:
+    """Read timeout: compute_ms for the firmware plus twice the wire time of the reply and its ack."""
+    chars = 2 * read_bytes + 2 + 4  # 'r' + hex payload + '\n', then 'z00\n'
+    return int(compute_ms + 2 * chars * 10 * 1000 / _baud(target)) + 1
+
+
+def transaction(scope, target, command: str, data: bytes, read_bytes: int = 18, capture: bool = True,
+                reset: bool = False, platform: str = "CWNANO", compute_ms: float = 50):
+    """
+    One SimpleSerial exchange, entirely on the Pi: [reset], flush, [arm],
+    write, read, [capture]. Returns (trace, response); trace is None without
+    `capture` or if the capture timed out.
+    """
+    if reset:
+        reset_target(scope, platform)
+    drain(target)
+
+    if capture:
+        scope.arm()
+    target.simpleserial_write(command, bytes(data))
+    response = target.simpleserial_read('r', read_bytes, timeout=serial_timeout_ms(target, read_bytes, compute_ms))
+    if not capture:
+        return None, response
+    if scope.capture():
+        return None, response
+    return scope.get_last_trace(), response
+
+
+def averaged_capture(scope, target, command: str, data: bytes, read_bytes: int = 18, repeats: int = 4,
+                     reduce: str = "mean", reset: bool = False, platform: str = "CWNANO"):
+    """
+    `repeats` transactions with the same input, reduced here so only one
+    trace crosses the link. Returns ((trace, variance), response), where
+    variance is per sample; (None, response) if every capture timed out.
+    """
+    if reduce not in ("mean", "median"):
+        raise ValueError(f"Unknown reduce: {reduce!r}")
+    rows = []
+    response = None
+    for _ in range(repeats):
+        trace, response = transaction(scope, target, command, data, read_bytes, reset=reset, platform=platform)
+        if trace is not None:
+            rows.append(np.array(trace, dtype=float))
+    if not rows:
+        return None, response
+    stack = np.stack(rows)
+    reduced = np.median(stack, axis=0) if reduce == "median" else stack.mean(axis=0)
+    return (reduced, stack.var(axis=0)), response
+
+
+def capture_one(scope, target, data: bytes, command: str = "a", read_bytes: int = 18,
+                reset: bool = True, platform: str = "CWNANO"):
+    """
+    helper_cv.cap_pass_trace on the Pi. Returns (trace, response), or
+    (None, None) if the capture timed out.
+    """
+    trace, response = transaction(scope, target, command, data, read_bytes, reset=reset, platform=platform)
+    return (None, None) if trace is None else (trace, response)
+
+
+def interact(target, command: str, data: bytes, bytes_to_read: int = 1):
+    _, response = transaction(None, target, command, data, bytes_to_read, capture=False, compute_ms=250)
+    return response
+
+
+def parse_script(text: str):
+    """
+    "drain; write x; read r 1; arm; write p 02000000; read r 1 50; capture"
+    -> (("drain",), ("write", "x", b""), ("read", "r", 1), ...). Payloads are hex.
+    """
+    steps = []
+    for part in text.split(";"):
+        words = part.split()
+        if not words:
+            continue
+        op, args = words[0], words[1:]
+        if op == "write":
+            steps.append(("write", args[0], bytes.fromhex(args[1]) if len(args) > 1 else b""))
+        elif op == "read":
+            steps.append(("read", args[0], int(args[1])) + tuple(float(a) for a in args[2:]))
+        elif op == "sleep":
+            steps.append(("sleep", float(args[0])))
+        else:
+            steps.append((op,))
+    return tuple(steps)
+
+
+def run_script(scope, target, script, platform: str = "CWNANO"):
+    """
+    A sequence of SimpleSerial steps in one call, so dependent exchanges
+    (interact, then capture) cost one round trip. `script` is a parse_script
+    string or a tuple of steps:
+      ("reset",) ("drain",) ("arm",) ("capture",) ("sleep", s)
+      ("write", cmd, data)  ("read", cmd, nbytes[, compute_ms=50])
+    Returns (responses, traces): one entry per read / capture, in order; a
+    capture that timed out gives None.
+    """
+    if isinstance(script, str):
+        script = parse_script(script)
+    responses, traces = [], []
+    for step in script:
+        op = step[0]
+        if op == "reset":
+            reset_target(scope, platform)
+        elif op == "drain":
+            drain(target)
+        elif op == "arm":
+            scope.arm()
+        elif op == "write":
+            target.simpleserial_write(step[1], bytes(step[2]))
+        elif op == "read":
+            compute_ms = step[3] if len(step) > 3 else 50  # as transaction()
+            responses.append(target.simpleserial_read(step[1], step[2],
+                                                      timeout=serial_timeout_ms(target, step[2], compute_ms)))
+        elif op == "capture":
+            traces.append(None if scope.capture() else np.array(scope.get_last_trace()))
+        elif op == "sleep":
+            time.sleep(step[1])
+        else:
+            raise ValueError(f"Unknown script step: {step!r}")
+    return responses, traces
+
+
+def passes(response, accept=None, reject=()) -> bool:
+    """The success predicate: a reply, not one of `reject`, and matching the `accept` regex (bytes) if given."""
+    if response is None:
+        return False
+    response = bytes(response)
+    if response in tuple(bytes(r) for r in reject):
+        return False
+    return accept is None or re.search(accept, response) is not None
+
+
+def verify_candidates(scope, target, command: str, candidates, read_bytes: int, accept=None, reject=(),
+                      compute_ms: float = 250, reset: bool = False, platform: str = "CWNANO"):
+    """
+    Send each candidate with `command` and read the reply, here on the Pi,
+    until one passes (see passes()). Returns (tried, candidate, response)
+    for the first that passes, else (tried, None, None).
+    """
+    tried = 0
+    for data in candidates:
+        tried += 1
+        _, response = transaction(scope, target, command, bytes(data), read_bytes, capture=False,
+                                  reset=reset, platform=platform, compute_ms=compute_ms)
+        if passes(response, accept, reject):
+            return tried, bytes(data), bytes(response)
+    return tried, None, None
+
+
+def _baud(target) -> float:
+    try:
+        return float(target.baud) or 38400.0
+    except Exception:
+        return 38400.0
+
+
+def call_pickled(fn, *args, **kwargs) -> bytes:
+    """fn(*args, **kwargs), pickled: bytes travel by value, so arrays come back in the same round trip."""
+    return pickle.dumps(fn(*args, **kwargs))
+
+
+def capture_batch(scope, target, inputs, command: str = "a", read_bytes: int = 18,
+                  reset: bool = True, platform: str = "CWNANO"):
+    """
+    Same sequence as helper_cv.cap_pass_trace, once per entry of `inputs`.
+    Returns (traces, responses): traces is a (N, samples) float array, rows
+    whose capture timed out are NaN and their response is None.
+    """
+    traces = np.full((len(inputs), scope.adc.samples), np.nan)
+    responses = []
+    for i, data in enumerate(inputs):
+        trace, response = capture_one(scope, target, data, command, read_bytes, reset, platform)
+        if trace is not None:
+            traces[i] = trace
+        responses.append(response)
+    return traces, responses
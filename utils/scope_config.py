@@ -0,0 +1,122 @@
+# scope_config.py — declarative scope/target setup, applied as a diff.
+#
+#   scope, target, prog = setup_cw(cw, cw.scope(), config="glitch-24MHz")
+#   scope, target, prog = setup_cw(cw, cw.scope(), config=ScopeConfig(samples=3500))
+#   apply_config(scope, target, "cpa-7.5MHz")              # switch profile mid-run
+#   save_profile("mine", snapshot(scope, target))          # scope_profiles.json
+#
+# A config lists dotted settings ("adc.samples", "io.clkout", "target.baud",
+# ...). setup_cw lays it over DEFAULT_SETUP (the fields CWNano.default_setup()
+# writes) and remote_ops.apply_settings reads, compares and writes only what
+# differs, in one round trip, instead of one remote write per field. It
+# first runs default_setup(), unless the scope already matches DEFAULT_SETUP
+# (fresh) or the wanted settings (a reconnect to a board set up like this).
+# Those checks only cover the listed fields; setup_cw(default_setup=False)
+# never runs it. With baud unset and clkout set, the baud follows the clock
+# like the solve scripts do (BAUD * NEWCLOCK / CLOCK).
+from __future__ import annotations
+import json, os
+from dataclasses import dataclass, field
+
+from .remote_cw import remote_ops_for, bcolors
+
+DEFAULT_CLKOUT = 7.5e6
+DEFAULT_BAUD = 38400
+
+# the fields CWNano.default_setup() writes
+DEFAULT_SETUP = {
+    "adc.clk_freq": 7.5e6,
+    "io.clkout": DEFAULT_CLKOUT,
+    "adc.samples": 5000,
+    "glitch.repeat": 0,
+}
+
+SNAPSHOT_PATHS = ("adc.samples", "adc.clk_freq", "io.clkout", "glitch.repeat", "glitch.ext_offset", "target.baud")
+
+PROFILE_FILE = "scope_profiles.json"
+
+
+@dataclass
+class ScopeConfig:
+    samples: int | None = None
+    clk_freq: float | None = None   # adc.clk_freq
+    clkout: float | None = None     # io.clkout (target clock)
+    baud: float | None = None       # None: scaled with clkout
+    extra: dict = field(default_factory=dict)  # any other dotted path -> value
+
+    def settings(self) -> dict:
+        out = {}
+        for path, value in (("adc.samples", self.samples), ("adc.clk_freq", self.clk_freq),
+                            ("io.clkout", self.clkout), ("target.baud", self.baud)):
+            if value is not None:
+                out[path] = value
+        out.update(self.extra)
+        return out
+
+    @classmethod
+    def from_settings(cls, settings: dict) -> "ScopeConfig":
+        settings = dict(settings)
+        return cls(samples=settings.pop("adc.samples", None), clk_freq=settings.pop("adc.clk_freq", None),
+                   clkout=settings.pop("io.clkout", None), baud=settings.pop("target.baud", None), extra=settings)
+
+
+PROFILES = {
+    # Calculation / DarkGatekeeper: target clocked up to 24 MHz for glitching
+    "glitch-24MHz": ScopeConfig(samples=1000, clk_freq=7.5e6, clkout=24e6),
+    # Alchemist / Hyperspace / EchoesOfChaos: default clocks, ADC at 7.5 MHz
+    "cpa-7.5MHz": ScopeConfig(clk_freq=7.5e6, clkout=DEFAULT_CLKOUT),
+}
+
+
+def save_profile(name: str, config: ScopeConfig, path: str = PROFILE_FILE) -> None:
+    profiles = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            profiles = json.load(f)
+    profiles[name] = config.settings()
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(profiles, f, indent=2)
+    os.replace(tmp, path)
+
+
+def load_profile(name: str, path: str = PROFILE_FILE) -> ScopeConfig:
+    """A saved profile from `path`, else a built-in one from PROFILES."""
+    if os.path.exists(path):
+        with open(path) as f:
+            profiles = json.load(f)
+        if name in profiles:
+            return ScopeConfig.from_settings(profiles[name])
+    if name in PROFILES:
+        return PROFILES[name]
+    raise KeyError(f"no scope profile {name!r} in {path} or the built-ins")
+
+
+def snapshot(scope, target, paths=SNAPSHOT_PATHS) -> ScopeConfig:
+    """The current settings as a ScopeConfig (one round trip)."""
+    return ScopeConfig.from_settings(dict(remote_ops_for(scope).read_settings(scope, target, tuple(paths))))
+
+
+def apply_config(scope, target, config: ScopeConfig | str, base: dict | None = None, default_setup: bool = False,
+                 verbose: bool = True):
+    """
+    Bring scope/target to `config` (a ScopeConfig or profile name) laid over
+    `base`, writing only what differs. default_setup=True runs
+    scope.default_setup() first unless the scope already matches `base` or
+    the result. Returns ((path, old, new), ...).
+    """
+    if isinstance(config, str):
+        config = load_profile(config)
+    settings = dict(base or {})
+    settings.update(config.settings())
+    baud_per_hz = None
+    if "target.baud" not in settings and "io.clkout" in settings:
+        baud_per_hz = DEFAULT_BAUD / DEFAULT_CLKOUT
+    ops = remote_ops_for(scope)
+    changed = ops.apply_settings(scope, target, tuple(settings.items()), baud_per_hz, default_setup,
+                                 tuple((base or {}).items()))
+    changed = tuple((path, old, new) for path, old, new in changed)  # plain values, not netrefs
+    if verbose:
+        for path, old, new in changed:
+            print(f"{bcolors.OKCYAN}[scope]{bcolors.ENDC} {path}: {old} -> {new}")
+    return changed
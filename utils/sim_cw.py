@@ -0,0 +1,354 @@
+# sim_cw.py — a ChipWhisperer that lives in this process.
+#
+#   cfg = RemoteConfig(host="sim", user="sim", transport="sim")
+#   with remote_cw(cfg) as cw:                    # no SSH, no Pi, no board
+#       scope, target, prog = setup_cw(cw, cw.scope())
+#       upload_firmware(cw, scope, prog, "hyperspaceJumpDrive")   # picks the Hyperspace model
+#
+# Implements the part of the chipwhisperer API the solves use: scope.arm /
+# capture / get_last_trace / adc / io / glitch, target.simpleserial_write /
+# read / read_witherrors / in_waiting / read / flush, GlitchController,
+# program_target. The target speaks real SimpleSerial 1.1 framing, so the
+# drain and read paths in remote_ops run unchanged. What the firmware does is
+# a per-challenge Model, chosen from the firmware name given to
+# program_target; each returns the response and a leakage waveform that the
+# scope turns into a noisy trace. Everything runs locally at CPU speed.
+from __future__ import annotations
+import itertools, logging, posixpath
+import numpy as np
+
+from . import remote_ops
+from .leakage import HW
+
+
+# ---------------- challenge models ----------------
+class Model:
+    """
+    handle(cmd, data, glitch) -> (response, leakage)
+      response: payload bytes for the 'r' reply, or None for no reply
+      leakage:  1-D activity waveform (one value per sample from the trigger),
+                None when the command does not raise the trigger
+    `glitch` is the scope's glitch settings when armed, else None.
+    """
+    def handle(self, cmd: str, data: bytes, glitch):
+        return bytes(data), np.zeros(100)
+
+
+def _ops(*blocks) -> np.ndarray:
+    """Concatenate per-operation activity blocks into one waveform."""
+    return np.concatenate([np.asarray(b, dtype=float) for b in blocks]) if blocks else np.zeros(0)
+
+
+class HyperspaceModel(Model):
+    """'p' XORs the byte into each of the 12 key bytes, 160 samples apart (HW leakage); 'a' checks the key."""
+    def __init__(self, key: bytes = bytes.fromhex("37454c166e1c772d5b5a227b"), flag: bytes = b"ESC{21hYP35TrEEt}"):
+        self.key = key
+        self.flag = flag
+
+    def handle(self, cmd, data, glitch):
+        if cmd == "p":
+            leak = np.zeros(160 * len(self.key))
+            for i, k in enumerate(self.key):
+                leak[160 * i + 60] = HW[data[0] ^ k]
+            return b"\x01", leak
+        if cmd == "a":
+            return (self.flag if bytes(data) == self.key else b"thisIsNotTheFlag!"), _ops([1] * 40)
+        return None, None
+
+
+class AlchemistModel(Model):
+    """
+    'e' mixes the 8-byte input with key1 (HW(t ^ k1), one 203-sample block per
+    byte) and then key2 (HW(t ^ k1 ^ k2), 204-sample blocks); 'c' checks the 16-byte key.
+    """
+    def __init__(self, key: bytes = bytes.fromhex("4e614a2d556752643270586b38763573"),
+                 flag: bytes = b"a1c{Wh1teDragonT}"):
+        self.key = key
+        self.flag = flag
+
+    def handle(self, cmd, data, glitch):
+        if cmd == "e":
+            leak = np.zeros(20 + 203 * 8 + 204 * 8)
+            for i in range(8):
+                t = data[i] ^ self.key[i]
+                leak[20 + 203 * i + 191] = HW[t]
+                leak[20 + 203 * 8 + 204 * i + 100] = HW[t ^ self.key[8 + i]]
+            return bytes(data), leak  # the real firmware replies with the XXTEA ciphertext
+        if cmd == "c":
+            return (self.flag if bytes(data) == self.key else b"deadlyWhiteJade!!"), _ops([1] * 40)
+        return None, None
+
+
+class GateKeeperModel(Model):
+    """'a'/'b' compare the password byte by byte and stop at the first mismatch: each matching byte costs one more loop."""
+    def __init__(self, passwords: dict[str, bytes] | None = None):
+        self.passwords = passwords or {"a": b"gk1{s1mul4t3}", "b": b"gk2{S1mul4t3dGK1}"}
+
+    def handle(self, cmd, data, glitch):
+        if cmd not in self.passwords:
+            return None, None
+        pw = self.passwords[cmd]
+        blocks = []
+        for got, want in zip(bytes(data), pw):
+            blocks.append([2, 1 + 0.1 * HW[got], 1, 0])
+            if got != want:
+                break
+            blocks.append([3, 0, 3, 0, 3, 0, 3, 0])  # match: bump the counter, next byte
+        ok = bytes(data) == pw
+        blocks.append([3] * 20 if ok else [1] * 20)
+        return (b"Access granted!!!!" if ok else b"Access denied.....")[:18], _ops(*blocks)
+
+
+class SorterSongModel(Model):
+    """
+    'p' loads [value, secret[skip:]] into the work array, 'c' insertion-sorts
+    it (one block per shift, so the trace length follows the secret), 'x'
+    restores it, 'a' checks the 15-byte secret.
+    """
+    def __init__(self, secret=(7, 12, 43, 52, 57, 66, 80, 91, 104, 130, 150, 171, 200, 222, 240),
+                 flag: bytes = b"ESC{s0rt3d_s1mul4t3d}"):
+        self.secret = list(secret)
+        self.flag = flag
+        self.arr = list(self.secret)
+
+    def handle(self, cmd, data, glitch):
+        if cmd == "p":
+            skip = min(data[3], 14)
+            self.arr = [data[1]] + self.secret[skip:]
+            return bytes(data[1:3]), _ops([1] * 10)
+        if cmd == "c":
+            arr, blocks = self.arr, []
+            for i in range(1, len(arr)):
+                key, j = arr[i], i
+                while j > 0 and arr[j - 1] > key:
+                    arr[j] = arr[j - 1]
+                    j -= 1
+                    blocks.append([6, 0, 0] * 4)
+                arr[j] = key
+                blocks.append([2 * HW[key & 0xff]] * 8 + [0] * 8)  # store of key_sort
+            return b"\x01", _ops(*blocks)
+        if cmd == "x":
+            self.arr = list(self.secret)
+            return b"\x01", None
+        if cmd == "a":
+            ok = list(bytes(data)) == self.secret
+            return (self.flag if ok else b"thisIsNotDaFlag:(:<\n"), _ops([1] * 30)
+        return None, None
+
+
+class DarkGatekeeperModel(Model):
+    """'a' always denies, unless a glitch with a winning (repeat, ext_offset) lands; some settings crash the target."""
+    def __init__(self, flag: bytes = b"7N4>qp14c70!", wins=((4, 38),), crash_offsets=range(30, 36)):
+        self.flag = flag
+        self.wins = set(wins)
+        self.crash_offsets = set(crash_offsets)
+
+    def handle(self, cmd, data, glitch):
+        if cmd != "a":
+            return None, None
+        if glitch is not None:
+            setting = (int(glitch.repeat), int(glitch.ext_offset))
+            if setting in self.wins:
+                return self.flag.ljust(16, b"\x00") + b"Ac", _ops([1] * 50)
+            if setting[1] in self.crash_offsets and setting[0] > 2:
+                return None, None  # no trigger, no reply: looks like a reset
+        return b"Access Denied.....", _ops([1] * 50)
+
+
+MODELS = {  # firmware-name substring -> model; first match wins
+    "alchemist": AlchemistModel,
+    "darkgatekeeper": DarkGatekeeperModel,
+    "gatekeeper": GateKeeperModel,
+    "hyperspace": HyperspaceModel,
+    "sorter": SorterSongModel,
+}
+
+
+def model_for(fw_path: str) -> Model:
+    name = posixpath.basename(fw_path).lower()
+    for key, cls in MODELS.items():
+        if key in name:
+            return cls()
+    return Model()
+
+
+# ---------------- scope ----------------
+class _Attrs:
+    def __init__(self, **kw):
+        self.__dict__.update(kw)
+
+
+class SimScope:
+    simulated = True
+
+    def __init__(self, noise: float = 0.01, gain: float = 0.1, seed: int | None = None):
+        self.adc = _Attrs(samples=5000, clk_freq=7.5e6, timeout=2.0, offset=0, trig_count=0)
+        self.io = _Attrs(clkout=7.5e6, nrst="high_z", pdic="high_z")
+        self.io.vglitch_reset = lambda *a, **k: None
+        self.glitch = _Attrs(repeat=0, ext_offset=0, enabled=False, trigger_src="ext_single")
+        self.clock = _Attrs(adc_freq=7.5e6)
+        self.sn = "SIM"
+        self.connectStatus = True
+        self.noise = noise
+        self.gain = gain
+        self._rng = np.random.default_rng(seed)
+        self._armed = False
+        self._leak = None
+        self._trace = np.zeros(0)
+
+    def con(self, *a, **k):
+        self.connectStatus = True
+
+    def dis(self):
+        self.connectStatus = False
+
+    def default_setup(self):
+        pass
+
+    def arm(self):
+        self._armed = True
+        self._leak = None
+
+    def capture(self) -> bool:
+        """True on timeout (nothing triggered since arm()), like the real scope."""
+        armed, self._armed = self._armed, False
+        if not armed or self._leak is None:
+            return True
+        n = int(self.adc.samples)
+        trace = self._rng.normal(0.0, self.noise, n)
+        m = min(n, len(self._leak))
+        trace[:m] += self.gain * self._leak[:m]
+        self._trace = trace
+        self.adc.trig_count = len(self._leak)
+        return False
+
+    def get_last_trace(self, as_int: bool = False) -> np.ndarray:
+        return self._trace.copy()
+
+    def _triggered(self, leak):
+        if self._armed:
+            self._leak = leak
+
+
+# ---------------- target ----------------
+class SimTarget:
+    def __init__(self, scope: SimScope, owner: "SimCW"):
+        self.scope = scope
+        self.owner = owner
+        self.baud = 38400
+        self._rx = bytearray()
+
+    def simpleserial_write(self, cmd: str, data, end=None):
+        glitch = self.scope.glitch if self.scope._armed and int(self.scope.glitch.repeat) > 0 else None
+        response, leak = self.owner.model.handle(cmd, bytes(data), glitch)
+        if leak is not None:
+            self.scope._triggered(leak)
+        if response is not None:
+            self._rx += b"r" + bytes(response).hex().upper().encode() + b"\n" + b"z00\n"
+
+    def simpleserial_read(self, cmd: str, pay_len: int, end: str = "\n", timeout: int = 250, ack: bool = True):
+        res = self.simpleserial_read_witherrors(cmd, pay_len, end, timeout)
+        return res["payload"] if res["valid"] else None
+
+    def simpleserial_read_witherrors(self, cmd: str, pay_len: int, end: str = "\n", timeout: int = 250,
+                                     glitch_timeout: int = 8000, ack: bool = True) -> dict:
+        line = self._take_line()
+        full = line.decode(errors="replace")
+        if not line.startswith(cmd.encode()):
+            return {"valid": False, "payload": None, "full_response": full, "rv": None}
+        try:
+            payload = bytearray(bytes.fromhex(line[1:-1].decode()))
+        except ValueError:
+            return {"valid": False, "payload": None, "full_response": full, "rv": None}
+        ack_line = self._take_line()
+        rv = int(ack_line[1:-1] or b"0", 16) if ack_line.startswith(b"z") else None
+        return {"valid": len(payload) == pay_len, "payload": payload[:pay_len], "full_response": full, "rv": rv}
+
+    def in_waiting(self) -> int:
+        return len(self._rx)
+
+    def read(self, num_char: int = 0, timeout: int = 250) -> str:
+        num_char = num_char or len(self._rx)
+        out, self._rx = self._rx[:num_char], self._rx[num_char:]
+        return out.decode(errors="replace")
+
+    def flush(self):
+        self._rx.clear()
+
+    def _take_line(self) -> bytes:
+        i = self._rx.find(b"\n")
+        if i < 0:
+            out, self._rx = bytes(self._rx), bytearray()
+            return out
+        out, self._rx = bytes(self._rx[:i + 1]), self._rx[i + 1:]
+        return out
+
+
+# ---------------- chipwhisperer module stand-in ----------------
+class GlitchController:
+    """The subset of cw.GlitchController the solves use."""
+    def __init__(self, groups, parameters):
+        self.groups = list(groups)
+        self.parameters = list(parameters)
+        self.results = {g: 0 for g in self.groups}
+        self._ranges = {p: (0, 0) for p in self.parameters}
+        self._steps = {p: 1 for p in self.parameters}
+
+    def set_range(self, parameter, low, high):
+        self._ranges[parameter] = (low, high)
+
+    def set_step(self, parameter, step):
+        self._steps[parameter] = step
+
+    def set_global_step(self, step):
+        self._steps = {p: step for p in self.parameters}
+
+    def glitch_values(self):
+        axes = []
+        for p in self.parameters:
+            low, high = self._ranges[p]
+            axes.append(list(np.arange(low, high + self._steps[p] / 2, self._steps[p]).tolist()))
+        yield from itertools.product(*axes)
+
+    def add(self, group, *args, **kwargs):
+        self.results[group] += 1
+
+
+class SimCW:
+    """What remote_cw returns for transport="sim": a chipwhisperer module plus put_file/capture_batch."""
+    GlitchController = GlitchController
+    logging = logging
+    targets = _Attrs(SimpleSerial="SimpleSerial", SimpleSerial2="SimpleSerial2")
+    programmers = _Attrs(STM32FProgrammer="STM32FProgrammer", XMEGAProgrammer="XMEGAProgrammer",
+                         NEORV32Programmer="NEORV32Programmer", SAM4SProgrammer="SAM4SProgrammer")
+
+    def __init__(self, model: Model | None = None, seed: int | None = None, verbose: bool = True):
+        self.model = model or Model()
+        self.seed = seed
+        self.verbose = verbose
+        self.rpc_stats = None
+        self._scope: SimScope | None = None
+
+    def scope(self, *args, **kwargs) -> SimScope:
+        if self._scope is None:
+            self._scope = SimScope(seed=self.seed)
+        return self._scope
+
+    def target(self, scope, target_type=None, *args, **kwargs) -> SimTarget:
+        return SimTarget(scope, self)
+
+    def set_all_log_levels(self, level):
+        pass
+
+    def put_file(self, local_path: str, remote_name: str | None = None, mode: int = 0o644) -> str:
+        return posixpath.join("/remote_files", remote_name or posixpath.basename(local_path))
+
+    def program_target(self, scope, prog, fw_path: str, *args, force: bool = False, **kwargs):
+        self.model = model_for(fw_path)
+        if self.verbose:
+            print(f"[sim_cw] {posixpath.basename(fw_path)} -> {type(self.model).__name__}", flush=True)
+
+    def capture_batch(self, scope, target, inputs, command: str = "a", read_bytes: int = 18,
+                      reset: bool = True, platform: str = "CWNANO"):
+        return remote_ops.capture_batch(scope, target, tuple(bytes(x) for x in inputs), command=command,
+                                        read_bytes=read_bytes, reset=reset, platform=platform)
@@ -0,0 +1,158 @@
+# trace_store.py — append-only trace storage that survives a crash.
+#
+#   store = TraceStore("traces/alchemist", scope=scope, firmware="alchemistInfuser-CWNANO.hex")
+#   textin = store.inputs() + [os.urandom(8) for _ in range(NSAMPLES - len(store))]
+#   capture_into(store, cw, scope, target, textin, command="e")   # resumes where the last run stopped
+#   capture_into(store, cw, scope, target, textin, consume=consume, command="e")   # consume -> True stops early
+#   for inputs, traces in store.chunks(): ...                     # never more than one shard in RAM
+#
+# Layout of the directory:
+#   meta.json            scope settings (samples, clk_freq, clkout), firmware sha256, dtype
+#   traces-00000.npy     one (n, samples) array per appended chunk, read memory-mapped
+#   index.jsonl          one line per shard: its rows' inputs and responses (hex)
+# A shard only exists once its index line is written, so a capture killed
+# mid-chunk loses that chunk and nothing else.
+from __future__ import annotations
+import json, os
+import numpy as np
+
+from .remote_cw import _sha256_file, remote_ops_for
+
+
+def scope_settings(scope) -> dict:
+    """The scope parameters a trace set depends on (one round trip)."""
+    return dict(remote_ops_for(scope).scope_settings(scope))
+
+
+class TraceStore:
+    def __init__(self, path: str, scope=None, firmware: str | None = None, dtype: str = "float32"):
+        """
+        Open (or create) the store at `path`. When `scope` / `firmware` (a
+        local .hex path) are given they are recorded on creation and checked
+        when reopening, so a resumed capture cannot mix setups.
+        """
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        meta = {"dtype": dtype}
+        if scope is not None:
+            meta["scope"] = scope_settings(scope)
+        if firmware is not None:
+            meta["firmware_sha256"] = _sha256_file(firmware)
+
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                self.meta = json.load(f)
+            for k, v in meta.items():
+                if k in self.meta and self.meta[k] != v:
+                    raise ValueError(f"{path}: {k} is {self.meta[k]!r}, this run has {v!r}")
+        else:
+            self.meta = meta
+            _write_atomic(meta_path, json.dumps(meta, indent=2).encode())
+
+        self._shards: list[dict] = []
+        index_path = os.path.join(path, "index.jsonl")
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                for line in f:
+                    if line.strip():
+                        self._shards.append(json.loads(line))
+        self._offsets = np.cumsum([0] + [s["n"] for s in self._shards])
+
+    def __len__(self) -> int:
+        return int(self._offsets[-1])
+
+    # ---- writing ----
+    def append(self, inputs, traces, responses=None) -> None:
+        traces = np.asarray(traces, dtype=self.meta["dtype"])
+        if len(traces) != len(inputs):
+            raise ValueError(f"{len(inputs)} inputs for {len(traces)} traces")
+        if not len(traces):
+            return
+        responses = responses if responses is not None else [None] * len(inputs)
+        name = f"traces-{len(self._shards):05d}.npy"
+        tmp = os.path.join(self.path, name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, traces)
+        os.replace(tmp, os.path.join(self.path, name))
+        shard = {
+            "file": name,
+            "n": len(traces),
+            "inputs": [bytes(x).hex() for x in inputs],
+            "responses": [None if r is None else bytes(r).hex() for r in responses],
+        }
+        with open(os.path.join(self.path, "index.jsonl"), "a") as f:
+            f.write(json.dumps(shard) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._shards.append(shard)
+        self._offsets = np.append(self._offsets, self._offsets[-1] + len(traces))
+
+    # ---- reading ----
+    def inputs(self) -> list[bytes]:
+        return [bytes.fromhex(x) for s in self._shards for x in s["inputs"]]
+
+    def responses(self) -> list[bytes | None]:
+        return [None if r is None else bytes.fromhex(r) for s in self._shards for r in s["responses"]]
+
+    def shard(self, i: int) -> np.ndarray:
+        """Shard `i`, memory-mapped (nothing is read until indexed)."""
+        return np.load(os.path.join(self.path, self._shards[i]["file"]), mmap_mode="r")
+
+    def chunks(self, cols=slice(None)):
+        """Yield (inputs, traces[:, cols]) one shard at a time."""
+        for i, s in enumerate(self._shards):
+            yield [bytes.fromhex(x) for x in s["inputs"]], np.asarray(self.shard(i)[:, cols])
+
+    def read(self, rows=None, cols=slice(None)) -> np.ndarray:
+        """Rows (indices, default all) and sample columns, loading only the shards they fall in."""
+        rows = np.arange(len(self)) if rows is None else np.asarray(rows, dtype=int).reshape(-1)
+        rows = np.where(rows < 0, rows + len(self), rows)
+        which = np.searchsorted(self._offsets, rows, side="right") - 1
+        parts = []
+        for i in np.unique(which):
+            sel = which == i
+            parts.append((sel, np.asarray(self.shard(i)[rows[sel] - self._offsets[i]][:, cols])))
+        width = parts[0][1].shape[1] if parts else 0
+        out = np.empty((len(rows), width), dtype=self.meta["dtype"])
+        for sel, block in parts:
+            out[sel] = block
+        return out
+
+    def traces(self, cols=slice(None)) -> np.ndarray:
+        return self.read(cols=cols)
+
+
+def capture_into(store: TraceStore, cw, scope, target, inputs, chunk: int = 64, consume=None,
+                 **capture_kwargs) -> TraceStore:
+    """
+    cw.capture_batch `inputs` into `store`, one shard per chunk. Inputs the
+    store already holds (a previous, interrupted run) are skipped; they must
+    match what was recorded. consume(inputs_chunk, traces_chunk, done, total)
+    sees the stored shards first, then each new chunk; a True return stops
+    the capture there (see cpa.EarlyStop).
+    """
+    inputs = [bytes(x) for x in inputs]
+    done = store.inputs()
+    if inputs[:len(done)] != done:
+        raise ValueError(f"{store.path} holds {len(done)} traces for different inputs")
+    if consume is not None:
+        seen = 0
+        for part, traces in store.chunks():
+            seen += len(part)
+            if consume(part, traces, seen, len(inputs)):
+                return store
+    for i in range(len(done), len(inputs), chunk):
+        part = inputs[i:i + chunk]
+        traces, responses = cw.capture_batch(scope, target, part, **capture_kwargs)
+        store.append(part, traces, responses)
+        if consume is not None and consume(part, traces, i + len(part), len(inputs)):
+            break
+    return store
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)